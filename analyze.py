@@ -0,0 +1,106 @@
+"""
+Batch analysis of FEN/EPD lines
+
+Reads positions from files or stdin, one per line, and writes one JSON line
+per position in input order: fen, legal moves, check, outcome and, with
+--depth, the search score and best move. Lines are sent to a process pool in
+chunks, and only --pending chunks are in flight at once, so memory stays
+bounded on unbounded input.
+
+usage:
+    python -m chess analyze [files ...] [--depth 2] [--workers 4]
+"""
+
+import argparse
+import fileinput
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from chess import Board
+
+
+def analyze_position(line, depth=0) -> dict:
+    board = Board.from_fen(line)
+    moves = board.legal_moves_uci()
+    if not moves:
+        outcome = "checkmate" if board.in_check() else "stalemate"
+    elif board.fifty_moves():
+        outcome = "fifty_moves"
+    else:
+        outcome = None  # a single position has no repetition history
+
+    result = {
+        "fen": board.fen(),
+        "legal_moves": moves,
+        "check": board.in_check(),
+        "outcome": outcome,
+    }
+    if depth:
+        from engine import Engine
+
+        result["score"], result["best_move"] = Engine(depth).search(board)
+    return result
+
+
+def analyze_chunk(lines, depth=0) -> list:
+    """
+    Returns:
+        list of JSON strings, one per line, with "error" for lines that are
+        not a valid position
+    """
+    output = []
+    for line in lines:
+        try:
+            result = analyze_position(line, depth)
+        except (ValueError, IndexError, KeyError, AttributeError) as error:
+            result = {"input": line, "error": f"{type(error).__name__}: {error}"}
+        output.append(json.dumps(result))
+    return output
+
+
+def chunks(lines, size):
+    lines = (line.strip() for line in lines)
+    lines = (line for line in lines if line and not line.startswith("#"))
+    while chunk := list(islice(lines, size)):
+        yield chunk
+
+
+def analyze(lines, out, depth=0, workers=None, chunk_size=64, pending=None):
+    """
+    Analyzes lines in a process pool and writes the results to out in input
+    order. Reading stops while pending chunks are waiting for results.
+    """
+    pending = pending or 2 * (workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(workers) as pool:
+        futures = deque()
+        for chunk in chunks(lines, chunk_size):
+            futures.append(pool.submit(analyze_chunk, chunk, depth))
+            if len(futures) >= pending:
+                out.write("\n".join(futures.popleft().result()) + "\n")
+        while futures:
+            out.write("\n".join(futures.popleft().result()) + "\n")
+    out.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m chess analyze", description=__doc__.splitlines()[1]
+    )
+    parser.add_argument("files", nargs="*", help="files to read, stdin if none")
+    parser.add_argument("--depth", type=int, default=0, help="search depth, 0 for no score")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--pending", type=int, default=None, help="chunks in flight")
+    args = parser.parse_args(argv)
+
+    with fileinput.input(args.files) as lines:
+        analyze(lines, sys.stdout, args.depth, args.workers, args.chunk_size, args.pending)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+"""
+Micro-benchmarks of the rule core
+
+Times check, Piece.ispinned, piece_between, Board.fen, Board.move,
+Board.update_moves_made and Board.repetition on a fixed corpus of positions,
+and compares the timings with a stored baseline. fen rebuilds the ranks a
+move touches, fen_memo is a call on an unchanged board. Timings are divided
+by a pure python calibration loop, so a baseline made on one machine can be
+compared on another. Every benchmark is sampled in many rounds and compared
+by its median. A benchmark whose rounds spread widely gets a wider
+tolerance, so a busy machine does not report regressions.
+
+usage:
+    python bench.py                      compare with bench_baseline.json
+    python bench.py --save-baseline      write bench_baseline.json
+    python bench.py --json results.json  also write the results
+"""
+
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+
+from chess import Board, check, chess_notation_to_row_col, piece_between
+
+# name -> (fen, moves played from it before timing)
+CORPUS = {
+    "opening": (
+        "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+        "e2e4 e7e5 g1f3 b8c6 f1b5 a7a6 b5a4 g8f6 e1g1 f8e7",
+    ),
+    "middlegame": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", ""),
+    "endgame": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", "b4b1 h5h6 b1b4 h6h5"),
+    "pins": ("4k3/4r3/8/b7/8/4N3/3B4/4K3 w - - 0 1", ""),
+    "check": ("r3k3/8/8/8/7b/8/8/R3K2R w KQq - 0 1", ""),
+}
+BASELINE = "bench_baseline.json"
+
+
+def corpus_board(name) -> Board:
+    fen, moves = CORPUS[name]
+    board = Board.from_fen(fen)
+    for move in moves.split():
+        board.push_uci(move)
+    return board
+
+
+def first_move(board) -> tuple:
+    """
+    Returns:
+        <tuple(Piece, int, int)> first legal move in coordinate order
+    """
+    move = sorted(board.legal_moves_uci())[0]
+    from_row, from_col = chess_notation_to_row_col(move[:2])
+    return board[from_row][from_col], *chess_notation_to_row_col(move[2:4])
+
+
+def benchmarks(board) -> dict:
+    """
+    Returns:
+        dict of name -> function(number) that runs the benchmark number
+        times and returns the seconds spent in the timed code
+    """
+    king = board.kings[board.turn]
+    own = [piece for piece in board.pieces if piece.color == board.turn]
+    far = max(board.pieces, key=lambda piece: abs(piece.row - king.row) + abs(piece.col - king.col))
+    snapshot = board.to_bytes()
+    piece, row, col = first_move(board)
+    touched = {piece.row, row}  # the ranks a move rewrites
+
+    def loop(function):
+        def run(number):
+            start = time.perf_counter()
+            for _ in range(number):
+                function()
+            return time.perf_counter() - start
+
+        return run
+
+    def on_copy(function, notation):
+        """times function(board, piece, row, col) on a fresh copy every call"""
+
+        def run(number):
+            spent = 0.0
+            for _ in range(number):
+                copy = Board.from_bytes(snapshot)
+                copy.iscopy = not notation
+                piece, row, col = first_move(copy)
+                start = time.perf_counter()
+                function(copy, piece, row, col)
+                spent += time.perf_counter() - start
+            return spent
+
+        return run
+
+    def fen_after_move():
+        for rank in touched:
+            board.changed_rank(rank)
+        board.fen_memo = None
+        return board.fen()
+
+    return {
+        "check": loop(lambda: check(board)),
+        "ispinned": loop(lambda: [piece.ispinned(board) for piece in own]),
+        "piece_between": loop(lambda: piece_between(*king.pos, *far.pos, board)),
+        "fen": loop(fen_after_move),
+        "fen_memo": loop(board.fen),
+        "move": on_copy(lambda copy, piece, row, col: copy.move(piece, row, col), False),
+        "update_moves_made": on_copy(
+            lambda copy, piece, row, col: copy.update_moves_made(piece, row, col), True
+        ),
+        "repetition": loop(board.repetition),
+    }
+
+
+def calls_for(run, min_time) -> int:
+    """
+    Returns:
+        <int> number of calls for a sample of about min_time seconds
+    """
+    number = 1
+    while run(number) < min_time / 10 and number < 1 << 20:
+        number *= 2
+    return max(1, round(number * min_time / max(run(number), 1e-9)))
+
+
+def calibration_run(number) -> float:
+    """fixed pure python workload, the time unit of the relative timings"""
+    start = time.perf_counter()
+    for _ in range(number):
+        total = 0
+        for i in range(1000):
+            total += i * i % 7
+    return time.perf_counter() - start
+
+
+def spread(samples) -> float:
+    """
+    Returns:
+        <float> interquartile range of samples over their median
+    """
+    if len(samples) < 4:
+        return 0.0
+    low, _, high = statistics.quantiles(samples, n=4)
+    return (high - low) / statistics.median(samples)
+
+
+def run_benchmarks(repeat=20, only=None, min_time=0.02) -> dict:
+    """
+    Takes repeat rounds of samples over all benchmarks, each round starting
+    with a calibration sample, and keeps the median of every benchmark and
+    the spread of its rounds. Spreading the samples over the whole run keeps
+    a busy spell on the machine from slowing down only some of the benchmarks.
+    """
+    runs = {}
+    for name in CORPUS:
+        for function, run in benchmarks(corpus_board(name)).items():
+            if not only or function in only:
+                runs[f"{function}/{name}"] = run, calls_for(run, min_time)
+    calibration = calls_for(calibration_run, min_time)
+
+    seconds = {key: [] for key in runs}
+    relative = {key: [] for key in runs}
+    units = []
+    gc.disable()  # like timeit, collections would land in random samples
+    try:
+        for _ in range(repeat):
+            unit = calibration_run(calibration) / calibration
+            units.append(unit)
+            for key, (run, number) in runs.items():
+                sample = run(number) / number
+                seconds[key].append(sample)
+                relative[key].append(sample / unit)
+    finally:
+        gc.enable()
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "calibration": statistics.median(units),
+        "results": {
+            key: {
+                "seconds": statistics.median(seconds[key]),
+                "relative": statistics.median(relative[key]),
+                "spread": spread(relative[key]),
+            }
+            for key in runs
+        },
+    }
+
+
+def compare(current, baseline, tolerance=0.3) -> list:
+    """
+    The tolerance of a benchmark is widened to the larger spread of its
+    current and baseline rounds
+
+    Returns:
+        list of (name, ratio, status), ratio is current over baseline time
+        and status "regression", "improvement" or "ok"
+    """
+    rows = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            rows.append((name, None, "new"))
+            continue
+        previous = baseline["results"][name]
+        ratio = result["relative"] / previous["relative"]
+        allowed = max(tolerance, result.get("spread", 0.0), previous.get("spread", 0.0))
+        if ratio > 1 + allowed:
+            status = "regression"
+        elif ratio < 1 - allowed:
+            status = "improvement"
+        else:
+            status = "ok"
+        rows.append((name, ratio, status))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="overwrite the baseline")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed slowdown, 0.3 = 30%%")
+    parser.add_argument("--repeat", type=int, default=20, help="rounds of samples")
+    parser.add_argument("--only", nargs="*", help="benchmark names, e.g. fen move")
+    args = parser.parse_args(argv)
+
+    current = run_benchmarks(args.repeat, args.only)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(current, file, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(current, file, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    except FileNotFoundError:
+        print(f"no baseline at {args.baseline}, run with --save-baseline first")
+        return 1
+
+    regressions = 0
+    for name, ratio, status in compare(current, baseline, args.tolerance):
+        seconds = current["results"][name]["seconds"]
+        ratio = f"{ratio:6.2f}x" if ratio is not None else "      -"
+        print(f"{name:30} {seconds * 1e6:12.2f} us {ratio}  {status}")
+        regressions += status == "regression"
+    print(f"{regressions} regressions, tolerance {args.tolerance:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,8 +3,35 @@ Classes for all chess pieces and board
 """
 
 import copy
+import random
+import struct
+import weakref
 import numpy as np
 
+from bitboards import SLIDER_ATTACKS, squares
+
+# --- zobrist keys, fixed seed so keys are the same in every process ---
+_zobrist_random = random.Random(0x5A0B)
+ZOBRIST_PIECES = {
+    letter: [_zobrist_random.getrandbits(64) for _ in range(64)]
+    for letter in "PNBRQKpnbrqk"
+}
+ZOBRIST_CASTLING = {castle: _zobrist_random.getrandbits(64) for castle in "KQkq"}
+ZOBRIST_EN_PASSANT = [_zobrist_random.getrandbits(64) for _ in range(8)]
+ZOBRIST_BLACK = _zobrist_random.getrandbits(64)
+
+# --- Board.to_bytes() layout ---
+# placement: 64 nibbles, square row * 8 + col, 0 empty, PNBRQK 1-6, pnbrqk 9-14
+# flags: bit 0 black to move, bit 1-4 KQkq, bit 5 game_end, bit 6 moves_made included
+# en passant square (255 if none), halfmoves, fullmoves, number of repetition keys
+SNAPSHOT_HEADER = struct.Struct("<32sBBHHH")
+PIECE_CODES = " PNBRQK  pnbrqk"
+
+PIECE_VALUES = {"p": 100, "n": 320, "b": 330, "r": 500, "q": 900, "k": 20000}
+DIRECTIONS = [(1, 1), (1, -1), (-1, 1), (-1, -1), (1, 0), (-1, 0), (0, 1), (0, -1)]
+KNIGHT_MOVES = [(1, 2), (-1, -2), (1, -2), (-1, 2), (2, 1), (-2, -1), (2, -1), (-2, 1)]
+ALL_SQUARES = (1 << 64) - 1
+
 
 def row_col_to_chess_notation(row, col) -> str:
     num_to_alph = {0: "a", 1: "b", 2: "c", 3: "d", 4: "e", 5: "f", 6: "g", 7: "h"}
@@ -12,7 +39,61 @@ def row_col_to_chess_notation(row, col) -> str:
 
 
 def chess_notation_to_row_col(chess_notation: str):
-    return (ord(chess_notation[0].lower()) - 97, chess_notation[1] - 1)
+    """
+    Raises:
+        ValueError: if chess_notation is not a square a1-h8
+    """
+    if (
+        len(chess_notation) != 2
+        or chess_notation[0].lower() not in "abcdefgh"
+        or chess_notation[1] not in "12345678"
+    ):
+        raise ValueError(f"Not a square: {chess_notation!r}")
+    return (int(chess_notation[1]) - 1, ord(chess_notation[0].lower()) - 97)
+
+
+PROMOTIONS = " qrbn"
+NO_MOVE = 0xFFFF
+
+
+def encode_move(uci: str) -> int:
+    """
+    Returns:
+        <int> from square | to square << 6 | promotion << 12
+    """
+    from_row, from_col = chess_notation_to_row_col(uci[:2])
+    row, col = chess_notation_to_row_col(uci[2:4])
+    promotion = PROMOTIONS.index(uci[4:5] or " ")
+    return from_row * 8 + from_col | (row * 8 + col) << 6 | promotion << 12
+
+
+def decode_move(code: int) -> str:
+    start, end, promotion = code & 63, code >> 6 & 63, code >> 12
+    return (
+        row_col_to_chess_notation(start // 8, start % 8)
+        + row_col_to_chess_notation(end // 8, end % 8)
+        + PROMOTIONS[promotion].strip()
+    )
+
+
+def read_games(path):
+    """
+    Reads games from a text file, one game per line as moves in coordinate
+    notation ("e2e4 e7e5 g1f3 ..."), optionally ending with the result.
+    Blank lines and lines starting with "#" are skipped.
+
+    Yields:
+        <tuple(list[str], str)> of moves and result ("*" if missing)
+    """
+    with open(path) as games:
+        for line in games:
+            moves = line.split()
+            if not moves or moves[0].startswith("#"):
+                continue
+            result = "*"
+            if moves[-1] in ["1-0", "0-1", "1/2-1/2", "*"]:
+                result = moves.pop()
+            yield moves, result
 
 
 def on_straight(row1, col1, row2, col2) -> bool:
@@ -74,46 +155,31 @@ def piece_between(row1, col1, row2, col2, board) -> list:
     return pieces_between
 
 
-def check(board) -> tuple:
+def between_mask(row, col1, col2) -> int:
     """
     Returns:
-        king, bool, piece attacking
+        <int> bitboard of the squares on row strictly between col1 and col2
     """
-    king = board.kings[board.turn]
-
-    for piece in board.pieces:
-        if piece.color == king.color:
-            continue
+    low, high = sorted((col1, col2))
+    if high - low < 2:
+        return 0
+    return ((1 << (high - low - 1)) - 1) << (row * 8 + low + 1)
 
-        if piece.piece_type in ["b", "q"]:
-            if on_diagonal(*king.pos, *piece.pos):
-                if not piece_between(*king.pos, *piece.pos, board):
-                    return king, True, piece
 
-        if piece.piece_type in ["r", "q"]:
-            if on_straight(*king.pos, *piece.pos):
-                if not piece_between(*king.pos, *piece.pos, board):
-                    return king, True, piece            
-
-        if piece.piece_type in ["p", "k", "n"]:
-            moves = piece.moves if piece.piece_type != "p" else piece.attacking_moves
-            for row, col in moves:
-                if all(
-                    [
-                        king.row - row < 8,
-                        king.row - row >= 0,
-                        king.col - col < 8,
-                        king.col - col >= 0,
-                    ]
-                ):
-                    if (king.row - row, king.col - col) == piece.pos:
-                        return king, True, piece
+def check(board) -> tuple:
+    """
+    Returns:
+        king, bool, piece attacking
+    """
+    checkers = board.checkers[board.turn]
+    if checkers:
+        return board.kings[board.turn], True, checkers[0]
 
     return None, False, None
 
 
 def check_after_move(piece, row, col, board, color):
-    board_copy = copy.deepcopy(board)
+    board_copy = board.copy()
     board_copy.iscopy = True
     piece_copy = board_copy[piece.row][piece.col]
     board_copy.move(piece_copy, row, col)
@@ -126,7 +192,7 @@ def check_after_move(piece, row, col, board, color):
 
 
 def checkmate_after_move(piece, row, col, board, color):
-    board_copy = copy.deepcopy(board)
+    board_copy = board.copy()
     board_copy.iscopy = True
     piece_copy = board_copy[piece.row][piece.col]
     board_copy.move(piece_copy, row, col)
@@ -158,6 +224,7 @@ class Piece:
         self.piece_art = ""
         self.moves = []
         self.piece_type = ""
+        self.attacks = None, 0  # (pos, bitboard) of the last attack_bits(), see update_attacks()
 
     def __repr__(self):
         return f"{type(self).__name__}({self.color}, {row_col_to_chess_notation(*self.pos)})"
@@ -174,6 +241,28 @@ class Piece:
         self.update_legal_moves(board)
         return self.legal_moves
 
+    def attacked_squares(self, board) -> list:
+        """
+        Returns:
+            list of squares [(row, col)] this piece attacks, own pieces included
+        """
+        squares = []
+        for row, col in self.moves:
+            row, col = row + self.row, col + self.col
+            if 0 <= row < 8 and 0 <= col < 8:
+                squares.append((row, col))
+        return squares
+
+    def attack_bits(self, board) -> int:
+        """
+        Returns:
+            <int> bitboard of attacked_squares()
+        """
+        bits = 0
+        for row, col in self.attacked_squares(board):
+            bits |= 1 << (row * 8 + col)
+        return bits
+
     def ispinned(self, board):
         king = board.kings[self.color]
         if on_line(
@@ -206,6 +295,15 @@ class Piece:
                                 return True, get_direction(*self.pos, *piece.pos)
         return False, (0, 0)
 
+    def allowed_squares(self, board) -> int:
+        """
+        Returns:
+            <int> bitboard of the squares this piece may move to without
+            leaving its king in check, from the check and pin masks
+        """
+        check_mask, pins = board.legality_masks(self.color)
+        return check_mask & pins.get(self.pos, ALL_SQUARES)
+
     def update_legal_moves(self, board):
         self.legal_moves = []
         moves = copy.copy(self.moves)
@@ -213,6 +311,7 @@ class Piece:
         if board.game_end:
             return
 
+        allowed = self.allowed_squares(board)
         for row, col in moves:
             if all(
                 [
@@ -226,9 +325,7 @@ class Piece:
                     not board[row + self.row][col + self.col]
                     or board[row + self.row][col + self.col].color != self.color
                 ):
-                    if not check_after_move(
-                        self, row + self.row, col + self.col, board, self.color
-                    ):
+                    if allowed >> ((row + self.row) * 8 + col + self.col) & 1:
                         self.legal_moves.append((row + self.row, col + self.col))
 
 
@@ -245,57 +342,52 @@ class Pawn(Piece):
             self.moves = (-1, 0)
             self.attacking_moves = [(-1, 1), (-1, -1)]
 
+    def attacked_squares(self, board) -> list:
+        squares = []
+        for row, col in self.attacking_moves:
+            row, col = row + self.row, col + self.col
+            if 0 <= row < 8 and 0 <= col < 8:
+                squares.append((row, col))
+        return squares
+
     def update_legal_moves(self, board):
         self.legal_moves = []
-        pinned, pin_direction = self.ispinned(board)
 
         if board.game_end:
             return
 
+        allowed = self.allowed_squares(board)
+
         # --- moves ---
 
         row, col = self.moves
-        if not pinned or pin_direction == (row, col):
-            if not (board[self.row + row][self.col + col]):
-                if not check_after_move(
-                    self, self.row + row, self.col + col, board, self.color
-                ):
-                    self.legal_moves.append((self.row + row, self.col + col))
-                    if (self.row, self.color) in [(1, "W"), (6, "B")] and not board[
-                        self.row + 2 * row
-                    ][self.col + 2 * col]:
-                        if not check_after_move(
-                            self,
-                            self.row + 2 * row,
-                            self.col + 2 * col,
-                            board,
-                            self.color,
-                        ):
-                            self.legal_moves.append(
-                                (self.row + 2 * row, self.col + 2 * col)
-                            )
+        if not (board[self.row + row][self.col + col]):
+            if allowed >> ((self.row + row) * 8 + self.col + col) & 1:
+                self.legal_moves.append((self.row + row, self.col + col))
+            # A double step can block a check the single step does not
+            if (self.row, self.color) in [(1, "W"), (6, "B")] and not board[
+                self.row + 2 * row
+            ][self.col + 2 * col]:
+                if allowed >> ((self.row + 2 * row) * 8 + self.col + 2 * col) & 1:
+                    self.legal_moves.append((self.row + 2 * row, self.col + 2 * col))
 
         # --- attacks ---
         for row, col in self.attacking_moves:
-            if not pinned or (row, col) == pin_direction:
-                if all(
-                    [
-                        row + self.row < 8,
-                        row + self.row >= 0,
-                        col + self.col < 8,
-                        col + self.col >= 0,
-                    ]
-                ):
-                    if isinstance(board[self.row + row][self.col + col], Piece):
-                        if board[self.row + row][self.col + col].color != self.color:
-                            if not check_after_move(
-                                self, self.row + row, self.col + col, board, self.color
-                            ):
-                                self.legal_moves.append(
-                                    (self.row + row, self.col + col)
-                                )
+            if all(
+                [
+                    row + self.row < 8,
+                    row + self.row >= 0,
+                    col + self.col < 8,
+                    col + self.col >= 0,
+                ]
+            ):
+                if isinstance(board[self.row + row][self.col + col], Piece):
+                    if board[self.row + row][self.col + col].color != self.color:
+                        if allowed >> ((self.row + row) * 8 + self.col + col) & 1:
+                            self.legal_moves.append((self.row + row, self.col + col))
 
         # --- en passant ---
+        # Removes two pieces from the rank, so it is still tested on a copy
         if (self.row, self.color) in [(3, "B"), (4, "W")]:
             for col in [1, -1]:
                 if all(
@@ -341,48 +433,60 @@ class King(Piece):
 
     def casteling_moves(self, board):
         row, col = self.row, self.col
-        if check(board)[1]:
+        if board.in_check(self.color):
             return
+        enemy = {"W": "B", "B": "W"}[self.color]
+        occupied = board.occupancy["W"] | board.occupancy["B"]
 
         if self.piece_type == "k":
             if self.color == "W":
                 if "K" in board.casteling:
-                    if not piece_between(*self.pos, self.row, 7, board):
+                    if not occupied & between_mask(row, col, 7):
                         if not (
-                            check_after_move(self, row, col + 1, board, self.color)
-                            or check_after_move(self, row, col + 2, board, self.color)
+                            board.is_attacked((row, col + 1), enemy)
+                            or board.is_attacked((row, col + 2), enemy)
                         ):
                             self.legal_moves.append((row, col + 2))
 
                 if "Q" in board.casteling:
-                    if not piece_between(*self.pos, self.row, 0, board):
+                    if not occupied & between_mask(row, col, 0):
                         if not (
-                            check_after_move(self, row, col - 1, board, self.color)
-                            or check_after_move(self, row, col - 2, board, self.color)
+                            board.is_attacked((row, col - 1), enemy)
+                            or board.is_attacked((row, col - 2), enemy)
                         ):
                             self.legal_moves.append((row, col - 2))
 
             else:
                 if "k" in board.casteling:
-                    if not piece_between(*self.pos, self.row, 7, board):
+                    if not occupied & between_mask(row, col, 7):
                         if not (
-                            check_after_move(self, row, col + 1, board, self.color)
-                            or check_after_move(self, row, col + 2, board, self.color)
+                            board.is_attacked((row, col + 1), enemy)
+                            or board.is_attacked((row, col + 2), enemy)
                         ):
                             self.legal_moves.append((row, col + 2))
 
                 if "q" in board.casteling:
-                    if not piece_between(*self.pos, self.row, 0, board):
+                    if not occupied & between_mask(row, col, 0):
                         if not (
-                            check_after_move(self, row, col - 1, board, self.color)
-                            or check_after_move(self, row, col - 2, board, self.color)
+                            board.is_attacked((row, col - 1), enemy)
+                            or board.is_attacked((row, col - 2), enemy)
                         ):
                             self.legal_moves.append((row, col - 2))
 
     def update_legal_moves(self, board):
-        super().update_legal_moves(board)
+        self.legal_moves = []
         if board.game_end:
             return
+
+        # The attack maps look through the king, so squares behind it along
+        # the checking line are attacked too
+        enemy = {"W": "B", "B": "W"}[self.color]
+        for row, col in self.attacked_squares(board):
+            if board[row][col] and board[row][col].color == self.color:
+                continue
+            if not board.is_attacked((row, col), enemy):
+                self.legal_moves.append((row, col))
+
         self.casteling_moves(board)
 
 
@@ -408,50 +512,27 @@ class Slider(Piece):
         super().__init__(color, **kwargs)
         self.moves = []
 
+    def attacked_squares(self, board) -> list:
+        return squares(self.attack_bits(board))
+
+    def attack_bits(self, board) -> int:
+        occupancy = board.occupancy["W"] | board.occupancy["B"]
+        enemy_king = board.kings.get({"W": "B", "B": "W"}[self.color])
+        if enemy_king and board[enemy_king.row][enemy_king.col] is enemy_king:
+            occupancy &= ~(1 << (enemy_king.row * 8 + enemy_king.col))
+        return SLIDER_ATTACKS[self.piece_type](self.row * 8 + self.col, occupancy)
+
     def update_legal_moves(self, board):
         self.legal_moves = []
         if board.game_end:
             return
 
-        # --- logic for pinning ---
-        moves = copy.copy(self.moves)
-        pinned, direction = self.ispinned(board)
-
-        if pinned:
-            if direction in moves:
-                dir_row, dir_col = direction
-                row, col = dir_row + self.row, dir_col + self.col
-                while all([row < 8, row >= 0, col < 8, col >= 0]):
-                    if not board[row][col]:
-                        if not check_after_move(self, row, col, board, self.color):
-                            self.legal_moves.append((row, col))
-
-                    else:
-                        if board[row][col].color != self.color:
-                            if not check_after_move(self, row, col, board, self.color):
-                                self.legal_moves.append((row, col))
-                        break
-
-                    col += dir_col
-                    row += dir_row
-                return
-        # ---
-
-        for dir_row, dir_col in moves:
-            row, col = dir_row + self.row, dir_col + self.col
-            while all([row < 8, row >= 0, col < 8, col >= 0]):
-                if not board[row][col]:
-                    if not check_after_move(self, row, col, board, self.color):
-                        self.legal_moves.append((row, col))
-
-                else:
-                    if board[row][col].color != self.color:
-                        if not check_after_move(self, row, col, board, self.color):
-                            self.legal_moves.append((row, col))
-                    break
-
-                col += dir_col
-                row += dir_row
+        square = self.row * 8 + self.col
+        occupancy = board.occupancy["W"] | board.occupancy["B"]
+        targets = SLIDER_ATTACKS[self.piece_type](square, occupancy)
+        targets &= ~board.occupancy[self.color]
+        targets &= self.allowed_squares(board)
+        self.legal_moves = squares(targets)
 
 
 class Rook(Slider):
@@ -488,6 +569,16 @@ class Queen(Slider):
         ]
 
 
+PIECE_CLASSES = {
+    "p": Pawn,
+    "n": Knight,
+    "b": Bishop,
+    "r": Rook,
+    "q": Queen,
+    "k": King,
+}
+
+
 class Board:
     """
     Board class, all game logic happens here.
@@ -499,14 +590,49 @@ class Board:
 
         reset(): calls setup_board() and sets white to turn
 
+        place(letter, row, col): puts a new piece, fen letter, on [row, col]
+
+        fen(): fen string, the placement is cached per rank
+
+        to_bytes() / from_bytes(data): compact snapshot of the game state
+
+        copy(): copy-on-write copy of the board, for branching
+
+        from_fen(fen): board from a fen string
+
+        goto(ply): jumps to a ply of the game, history keeps the moves after it
+
         capture(row, col): removes piece on chess_borad[row][col]
+
+        update_attacks(): updates attacked squares and checking pieces
+
+        legality_masks(color): check evasion and pin masks of color
+
+        is_attacked(square, color): True if color attacks square
+
+        in_check(color): True if the king of color is in check
+
+        attackers(square, color, removed): pieces attacking square
+
+        see(piece, row, col): static exchange evaluation of a capture
     """
 
-    def __init__(self):
+    CHECKPOINT_INTERVAL = 16
+
+    def __init__(self, setup=True):
+        self.source = None  # board this copy() shares its state with
+        self.copies = None  # weakref.WeakSet of copy() boards sharing this state
+        self.history_shared = False  # history lists shared with a copy()
+        self.rank_placements = [None] * 8  # fen placement of each rank, None if changed
+        self.placement = None
+        self.fen_memo = None
         self.casteling = "KQkq"
         self.kings = {}
         self.pieces = []
-        self.chess_board = self.setup_board()
+        self.chess_board = (
+            self.setup_board() if setup else [[None] * 8 for _ in range(8)]
+        )
+        self.rehash()
         self.turn = "W"
         self.en_passant_able = ()
         self.moves_made = []
@@ -515,6 +641,12 @@ class Board:
         self.fullmoves = 1
         self.game_end = False
         self.positions = []
+        self.history = []
+        self.ply = 0
+        self.checkpoints = {}
+        self.attacked = {"W": 0, "B": 0}  # bitboards
+        self.checkers = {"W": [], "B": []}
+        self.update_attacks()
 
     def __str__(self):
         board_str = "\n"
@@ -527,20 +659,28 @@ class Board:
         return self.chess_board[index]
 
     def __setitem__(self, index, value):
+        self.unshare()
         self.chess_board[index] = value
+        self.changed_rank(index)
+        self.rehash()
 
     def __len__(self):
         return len(self.chess_board)
 
-    def fen(self):
-        fen = ""
-        for row in reversed(self.chess_board):
+    def changed_rank(self, row):
+        """Drops the cached fen placement of a rank, call after writing to it"""
+        self.rank_placements[row] = None
+        self.placement = None
+
+    def rank_placement(self, row) -> str:
+        if self.rank_placements[row] is None:
+            rank = ""
             empty_squares = 0
-            for square in row:
+            for square in self.chess_board[row]:
                 if square:
                     if empty_squares > 0:
-                        fen += str(empty_squares)
-                    fen += (
+                        rank += str(empty_squares)
+                    rank += (
                         square.piece_type.upper()
                         if square.color == "W"
                         else square.piece_type
@@ -549,9 +689,30 @@ class Board:
                 else:
                     empty_squares += 1
             if empty_squares > 0:
-                fen += str(empty_squares)
-            fen += "/"
-        fen = fen[:-1] + " "  # remove last "/"
+                rank += str(empty_squares)
+            self.rank_placements[row] = rank
+        return self.rank_placements[row]
+
+    def fen(self):
+        """
+        The placement is built from cached ranks, only the ranks changed since
+        the last call are rebuilt. Calls on an unchanged board return the
+        same string.
+        """
+        if self.placement is None:
+            self.placement = "/".join(self.rank_placement(row) for row in range(7, -1, -1))
+        state = (
+            self.placement,
+            self.turn,
+            self.casteling,
+            self.en_passant_able,
+            self.halfmoves,
+            self.fullmoves,
+        )
+        if self.fen_memo and self.fen_memo[0] == state:
+            return self.fen_memo[1]
+
+        fen = self.placement + " "
         casteling = "".join(self.casteling.split("-"))
         fen += self.turn.lower() + " " + (casteling if casteling else "-") + " "
 
@@ -563,8 +724,233 @@ class Board:
 
         fen += str(self.halfmoves) + " " + str(self.fullmoves)
 
+        self.fen_memo = state, fen
         return fen
 
+    def toggle_key(self, piece):
+        """
+        XORs piece on its square into the placement and pawn keys, call
+        before and after a piece is moved, added or removed
+        """
+        letter = piece.piece_type.upper() if piece.color == "W" else piece.piece_type
+        bits = ZOBRIST_PIECES[letter][piece.row * 8 + piece.col]
+        self.placement_hash ^= bits
+        if piece.piece_type == "p":
+            self.pawn_hash ^= bits
+
+    def rehash(self):
+        """Recomputes the placement and pawn keys from all pieces"""
+        self.placement_hash = self.pawn_hash = 0
+        for piece in self.pieces:
+            self.toggle_key(piece)
+
+    def placement_key(self) -> int:
+        """
+        Returns:
+            <int> 64 bit zobrist key of the piece placement only, kept up to
+            date by every write
+        """
+        return self.placement_hash
+
+    def pawn_key(self) -> int:
+        """
+        Returns:
+            <int> 64 bit zobrist key of the pawns only
+        """
+        return self.pawn_hash
+
+    def zobrist_key(self) -> int:
+        """
+        Returns:
+            <int> 64 bit zobrist key of placement, turn, casteling and en passant
+        """
+        key = self.placement_hash
+        if self.turn == "B":
+            key ^= ZOBRIST_BLACK
+        for castle in self.casteling:
+            if castle != "-":
+                key ^= ZOBRIST_CASTLING[castle]
+        if self.en_passant_able:
+            key ^= ZOBRIST_EN_PASSANT[self.en_passant_able[1]]
+        return key
+
+    def zobrist_key_after(self, uci: str) -> int:
+        """
+        Key of the position after a legal move, without playing it. Follows
+        the casteling, en passant and promotion rules of move() and push_uci().
+
+        Returns:
+            <int> zobrist_key() the board would have after push_uci(uci)
+        """
+        from_row, from_col = chess_notation_to_row_col(uci[:2])
+        row, col = chess_notation_to_row_col(uci[2:4])
+        piece = self[from_row][from_col]
+        kind, white = piece.piece_type, piece.color == "W"
+        letter = kind.upper() if white else kind
+
+        key = self.zobrist_key() ^ ZOBRIST_BLACK
+        if self.en_passant_able:
+            key ^= ZOBRIST_EN_PASSANT[self.en_passant_able[1]]
+        key ^= ZOBRIST_PIECES[letter][from_row * 8 + from_col]
+        captured = self[row][col]
+        if kind == "p" and (row, col) == self.en_passant_able:
+            captured = self[from_row][col]
+        if captured:
+            captured_letter = (
+                captured.piece_type.upper() if captured.color == "W" else captured.piece_type
+            )
+            key ^= ZOBRIST_PIECES[captured_letter][captured.row * 8 + captured.col]
+        if kind == "p" and row in [0, 7]:
+            promotion = uci[4:5] or "q"
+            letter = promotion.upper() if white else promotion.lower()
+        key ^= ZOBRIST_PIECES[letter][row * 8 + col]
+
+        if kind == "p" and abs(row - from_row) == 2:
+            key ^= ZOBRIST_EN_PASSANT[col]
+
+        # --- casteling rook and rights, as in move() ---
+        lost = set()
+        if kind == "k":
+            home = 0 if white else 7
+            rights = "KQ" if white else "kq"
+            if (from_row, from_col) == (home, 4) and row == home and col in [2, 6]:
+                castle = rights[0] if col == 6 else rights[1]
+                if castle in self.casteling:
+                    rook_col, rook_to = (7, 5) if col == 6 else (0, 3)
+                    rook = "R" if white else "r"
+                    key ^= ZOBRIST_PIECES[rook][home * 8 + rook_col]
+                    key ^= ZOBRIST_PIECES[rook][home * 8 + rook_to]
+            lost.update(rights)
+        if kind == "r" and from_col in [0, 7]:
+            lost.add(("Q" if from_col == 0 else "K") if white else ("q" if from_col == 0 else "k"))
+        corners = {(0, 0): "Q", (0, 7): "K", (7, 0): "q", (7, 7): "k"}
+        if (row, col) in corners:
+            lost.add(corners[(row, col)])
+        for castle in lost:
+            if castle in self.casteling:
+                key ^= ZOBRIST_CASTLING[castle]
+        return key
+
+    def place(self, letter, row, col):
+        """
+        Puts a new piece on [row, col], uppercase letters are white
+        """
+        self.unshare()
+        color = "W" if letter.isupper() else "B"
+        piece = PIECE_CLASSES[letter.lower()](color, row=row, col=col)
+        self.chess_board[row][col] = piece
+        self.changed_rank(row)
+        self.pieces.append(piece)
+        self.toggle_key(piece)
+        if piece.piece_type == "k":
+            self.kings[color] = piece
+        return piece
+
+    def to_bytes(self, moves=True) -> bytes:
+        """
+        Snapshot of position, rights, counters and repetition keys, see
+        SNAPSHOT_HEADER. Restore with Board.from_bytes().
+
+        Arguments:
+            moves<bool>: include moves_made
+        """
+        placement = bytearray(32)
+        for piece in self.pieces:
+            letter = piece.piece_type.upper() if piece.color == "W" else piece.piece_type
+            square = piece.row * 8 + piece.col
+            placement[square // 2] |= PIECE_CODES.index(letter) << (4 * (square % 2))
+
+        flags = self.turn == "B"
+        for i, castle in enumerate("KQkq"):
+            if castle in self.casteling:
+                flags |= 1 << (i + 1)
+        flags |= self.game_end << 5 | moves << 6
+
+        en_passant = 255
+        if self.en_passant_able:
+            en_passant = self.en_passant_able[0] * 8 + self.en_passant_able[1]
+
+        data = SNAPSHOT_HEADER.pack(
+            bytes(placement),
+            flags,
+            en_passant,
+            self.halfmoves,
+            self.fullmoves,
+            len(self.positions),
+        ) + struct.pack(f"<{len(self.positions)}Q", *self.positions)
+        if moves:
+            notation = " ".join(self.moves_made).encode()
+            data += struct.pack("<I", len(notation)) + notation
+        return data
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """
+        Returns:
+            <Board> restored from Board.to_bytes(), without calling setup_board()
+        """
+        placement, flags, en_passant, halfmoves, fullmoves, keys = (
+            SNAPSHOT_HEADER.unpack_from(data)
+        )
+        board = cls(setup=False)
+        for square in range(64):
+            code = placement[square // 2] >> (4 * (square % 2)) & 15
+            if code:
+                board.place(PIECE_CODES[code], square // 8, square % 8)
+
+        board.turn = "B" if flags & 1 else "W"
+        board.casteling = "".join(
+            castle if flags & 1 << (i + 1) else "-" for i, castle in enumerate("KQkq")
+        )
+        board.game_end = bool(flags & 1 << 5)
+        board.en_passant_able = (
+            (en_passant // 8, en_passant % 8) if en_passant != 255 else ()
+        )
+        board.halfmoves = halfmoves
+        board.fullmoves = fullmoves
+
+        offset = SNAPSHOT_HEADER.size
+        board.positions = list(struct.unpack_from(f"<{keys}Q", data, offset))
+        offset += 8 * keys
+        if flags & 1 << 6:
+            (length,) = struct.unpack_from("<I", data, offset)
+            notation = data[offset + 4 : offset + 4 + length].decode()
+            board.moves_made = notation.split(" ") if notation else []
+
+        board.update_attacks()
+        return board
+
+    @classmethod
+    def from_fen(cls, fen: str):
+        """
+        Returns:
+            <Board> from a fen string, halfmove and fullmove counters are
+            optional so epd lines work too
+        """
+        fields = fen.split()
+        board = cls(setup=False)
+        for row, rank in enumerate(reversed(fields[0].split("/"))):
+            col = 0
+            for letter in rank:
+                if letter.isdigit():
+                    col += int(letter)
+                else:
+                    board.place(letter, row, col)
+                    col += 1
+
+        board.turn = fields[1].upper()
+        board.casteling = "".join(
+            castle if castle in fields[2] else "-" for castle in "KQkq"
+        )
+        if fields[3] != "-":
+            board.en_passant_able = chess_notation_to_row_col(fields[3])
+        if len(fields) > 5 and fields[4].isdigit() and fields[5].isdigit():
+            board.halfmoves = int(fields[4])
+            board.fullmoves = int(fields[5])
+
+        board.update_attacks()
+        return board
+
     def setup_board(self):
         board = []
 
@@ -609,8 +995,78 @@ class Board:
         return board
 
     def reset(self):
+        self.unshare()
         self.__init__()
 
+    def copy(self):
+        """
+        Copy-on-write: the copy shares pieces and caches with this board
+        until either of them writes through a Board method, see unshare().
+        history, moves_made and checkpoints stay shared until one of them
+        records a move. Writing into a rank, board[row][col] = piece, is
+        not tracked and changes every board sharing it. Legal moves are
+        stored in the shared pieces, which is harmless while the boards are
+        in the same position. Piece objects stay with the board that was
+        copied, the copies get new ones.
+
+        Returns:
+            <Board> in the same position
+        """
+        board = type(self).__new__(type(self))
+        board.__dict__.update(self.__dict__)
+        source = self if self.source is None else self.source
+        if source.copies is None:
+            source.copies = weakref.WeakSet()
+        source.copies.add(board)
+        board.source = source
+        board.copies = None
+        self.history_shared = board.history_shared = True
+        return board
+
+    @property
+    def shared(self) -> bool:
+        return self.source is not None or bool(self.copies)
+
+    def unshare(self):
+        """
+        Ends the sharing with copy() boards, called before every write. A
+        copy takes new pieces for itself, the board that was copied hands
+        new pieces to its copies that are still alive and keeps its own.
+        """
+        if self.source is not None:
+            self.source.copies.discard(self)
+            self.source = None
+            self.own_pieces()
+        elif self.copies:
+            for board in list(self.copies):
+                board.source = None
+                board.own_pieces()
+            self.copies = None
+
+    def own_pieces(self):
+        pieces = {id(piece): copy.copy(piece) for piece in self.pieces}
+        self.pieces = list(pieces.values())
+        self.chess_board = [
+            [pieces[id(piece)] if piece else None for piece in rank]
+            for rank in self.chess_board
+        ]
+        self.kings = {color: pieces[id(king)] for color, king in self.kings.items()}
+        self.checkers = {
+            color: [pieces[id(piece)] for piece in checkers]
+            for color, checkers in self.checkers.items()
+        }
+        self.masks = {}
+        self.rank_placements = list(self.rank_placements)
+        self.positions = list(self.positions)
+
+    def own_history(self):
+        """Copies history, moves_made and checkpoints before changing them"""
+        if self.history_shared:
+            self.history = list(self.history)
+            self.moves_made = list(self.moves_made)
+            self.checkpoints = dict(self.checkpoints)
+            self.history_shared = False
+
     def get_all_legal_moves(self):
         legal_moves = []
         for piece in self.pieces:
@@ -618,7 +1074,82 @@ class Board:
                 legal_moves += piece.get_legal_moves(self)
         return legal_moves
 
+    def legal_moves_uci(self) -> list:
+        """
+        Returns:
+            list of legal moves for the side to move in coordinate notation,
+            one move per promotion piece
+        """
+        moves = []
+        for piece in self.pieces:
+            if piece.color != self.turn:
+                continue
+            start = row_col_to_chess_notation(*piece.pos)
+            for row, col in piece.get_legal_moves(self):
+                move = start + row_col_to_chess_notation(row, col)
+                if isinstance(piece, Pawn) and row in [0, 7]:
+                    moves += [move + promotion for promotion in "qrbn"]
+                else:
+                    moves.append(move)
+        return moves
+
+    def legal_move_map(self) -> dict:
+        """
+        Returns:
+            <dict> (row, col) of every piece of the side to move -> list of
+            its legal moves [(row, col)]
+        """
+        return {
+            piece.pos: list(piece.get_legal_moves(self))
+            for piece in self.pieces
+            if piece.color == self.turn
+        }
+
+    def san(self, uci: str) -> str:
+        """
+        Returns:
+            <str> standard algebraic notation of a legal move given in
+            coordinate notation, e.g. "g1f3" -> "Nf3"
+        """
+        from_row, from_col = chess_notation_to_row_col(uci[:2])
+        row, col = chess_notation_to_row_col(uci[2:4])
+        piece = self[from_row][from_col]
+        if piece.piece_type == "k" and abs(col - from_col) == 2:
+            notation = "O-O" if col == 6 else "O-O-O"
+        elif piece.piece_type == "p":
+            notation = uci[2:4]
+            if from_col != col:
+                notation = uci[0] + "x" + notation
+            if row in [0, 7]:
+                notation += "=" + (uci[4:5] or "q").upper()
+        else:
+            others = [
+                other.pos
+                for other in self.pieces
+                if other is not piece
+                and other.color == piece.color
+                and other.piece_type == piece.piece_type
+                and (row, col) in other.get_legal_moves(self)
+            ]
+            disambiguation = ""
+            if others:
+                if all(other_col != from_col for _, other_col in others):
+                    disambiguation = uci[0]
+                elif all(other_row != from_row for other_row, _ in others):
+                    disambiguation = uci[1]
+                else:
+                    disambiguation = uci[:2]
+            capture = "x" if self[row][col] else ""
+            notation = piece.piece_type.upper() + disambiguation + capture + uci[2:4]
+
+        child = Board.from_bytes(self.to_bytes(moves=False))
+        child.push_uci(uci, validate=False, notation=False)
+        if child.in_check():
+            notation += "#" if not child.get_all_legal_moves() else "+"
+        return notation
+
     def promote_pawn(self, new_piece):
+        self.unshare()
         for piece in self.pieces:
             if isinstance(piece, Pawn) and piece.row in [0, 7]:
                 pawn = piece  # Pawn that is promoting
@@ -639,8 +1170,16 @@ class Board:
 
         new_piece = fen_to_class[new_piece]
         self[pawn.row][pawn.col] = new_piece
+        self.changed_rank(pawn.row)
         self.pieces.remove(pawn)
         self.pieces.append(new_piece)
+        self.toggle_key(pawn)
+        self.toggle_key(new_piece)
+        self.update_attacks()
+        if self.iscopy or not self.moves_made:
+            return
+        self.own_history()
+        self.history[-1] += new_piece.piece_type
         self.moves_made[-1] = (
             str(
                 self.moves_made[-1][:-1]
@@ -654,16 +1193,14 @@ class Board:
 
     def checkmate(self):
         if len(self.get_all_legal_moves()) == 0:
-            _, in_check, _ = check(self)
-            if in_check:
+            if self.in_check():
                 self.game_end = True
                 return True
         return False
 
     def stalemate(self):
         if len(self.get_all_legal_moves()) == 0:
-            _, in_check, _ = check(self)
-            if not in_check:
+            if not self.in_check():
                 self.game_end = True
                 return True
         return False
@@ -675,20 +1212,36 @@ class Board:
         return False
 
     def repetition(self):
-        current_fen = self.fen().split(" ")[0]
-        if (
-            sum([1 if current_fen in position else 0 for position in self.positions])
-            > 2
-        ):
+        if self.positions.count(self.placement_key()) > 2:
             self.game_end = True
             return True
         return False
 
+    def outcome(self):
+        """
+        Checks the rules that end the game, in the same order as the TUI
+
+        Returns:
+            <str> "checkmate", "stalemate", "fifty_moves", "repetition" or None
+        """
+        self.game_end = False  # set again below if the game is over
+        if not self.get_all_legal_moves():
+            self.game_end = True
+            return "checkmate" if self.in_check() else "stalemate"
+        if self.fifty_moves():
+            return "fifty_moves"
+        if self.repetition():
+            return "repetition"
+        return None
+
     def remis(self):
         # TODO
         return False
 
     def update_moves_made(self, piece, row, col):
+        if self.shared:
+            self.unshare()
+            piece = self[piece.row][piece.col]
         capture = ""
         if self[row][col]:
             capture = "x"
@@ -706,25 +1259,33 @@ class Board:
             ):
                 check = "#"
 
+        self.own_history()
         self.moves_made.append(
             previous_position + capture + row_col_to_chess_notation(row, col) + check
         )
 
-    def move(self, piece: Piece, row, col):
+    def move(self, piece: Piece, row, col, record=True):
         """
         Move Piece to [row, col]
 
         Arguments:
             piece<Piece>: piece to be moved
             square<[row, col]>: square moved to
+            record<bool>: add the move to history, False for the casteling rook
         """
+        if self.shared:
+            self.unshare()
+            piece = self[piece.row][piece.col]  # the piece of a copy() is a new object
+
+        if record and not self.iscopy:
+            self.record_history(piece, row, col)
 
         direction = 1 if piece.color == "W" else -1
 
         # --- en passant ---
         if isinstance(piece, Pawn):
             if (row, col) == self.en_passant_able:
-                self.capture(row - direction, col)
+                self.capture(row - direction, col, update=False)
 
         self.en_passant_able = ()
         if isinstance(piece, Pawn):
@@ -744,17 +1305,13 @@ class Board:
             if piece.color == "W":
                 if piece.pos == (0, 4):
                     if "K" in self.casteling and (row, col) == (0, 6):
-                        self.move(self[0][7], 0, 5)
-                        self.turn = {"W": "B", "B": "W"}[
-                            self.turn
-                        ]  # We are making 2 moves, and therefore we need to toggle turn again
+                        self.move(self[0][7], 0, 5, record=False)
                         if not self.iscopy:
                             del self.moves_made[-2]
                             self.moves_made[-1] = "O-O"
 
                     if "Q" in self.casteling and (row, col) == (0, 2):
-                        self.move(self[0][0], 0, 3)
-                        self.turn = {"W": "B", "B": "W"}[self.turn]
+                        self.move(self[0][0], 0, 3, record=False)
                         if not self.iscopy:
                             del self.moves_made[-2]
                             self.moves_made[-1] = "O-O-O"
@@ -766,15 +1323,13 @@ class Board:
             else:
                 if piece.pos == (7, 4):
                     if "k" in self.casteling and (row, col) == (7, 6):
-                        self.move(self[7][7], 7, 5)
-                        self.turn = {"W": "B", "B": "W"}[self.turn]
+                        self.move(self[7][7], 7, 5, record=False)
                         if not self.iscopy:
                             del self.moves_made[-2]
                             self.moves_made[-1] = "O-O"
 
                     if "q" in self.casteling and (row, col) == (7, 2):
-                        self.move(self[7][0], 7, 3)
-                        self.turn = {"W": "B", "B": "W"}[self.turn]
+                        self.move(self[7][0], 7, 3, record=False)
                         if not self.iscopy:
                             del self.moves_made[-2]
                             self.moves_made[-1] = "O-O-O"
@@ -804,35 +1359,336 @@ class Board:
                         ["-" if castle == "k" else castle for castle in self.casteling]
                     )
 
+        # --- a rook captured on its starting square can not castle either ---
+        corners = {(0, 0): "Q", (0, 7): "K", (7, 0): "q", (7, 7): "k"}
+        if (row, col) in corners:
+            self.casteling = self.casteling.replace(corners[(row, col)], "-")
+
         self[piece.row][piece.col] = None
+        self.changed_rank(piece.row)
+        if not record:
+            # The casteling rook, the king move finishes the turn
+            self.toggle_key(piece)
+            piece.update_position(row, col)
+            self.toggle_key(piece)
+            self.chess_board[row][col] = piece
+            self.changed_rank(row)
+            return
+
         self.halfmoves += 1
         if isinstance(piece, Pawn) or self[row][col]:
             self.halfmoves = 0
             self.positions = []
 
         self.capture(
-            row, col
+            row, col, update=False
         )  # Before moving, capture piece if capture is going to happen
+        self.toggle_key(piece)
         piece.update_position(row, col)
+        self.toggle_key(piece)
         self.chess_board[row][col] = piece
+        self.changed_rank(row)
+        self.update_attacks()
         # --- turn finished ---
         if self.turn == "B":
             self.fullmoves += 1
-        self.positions.append(self.fen().split(" ")[0])
+        self.positions.append(self.placement_key())
         self.turn = {"W": "B", "B": "W"}[self.turn]
 
+    def record_history(self, piece, row, col):
+        """
+        Adds a move to history. Every CHECKPOINT_INTERVAL plies the position
+        before the move is stored, so goto() replays at most that many moves.
+        Moving from an earlier ply drops the rest of the old line.
+        """
+        self.own_history()
+        if self.ply < len(self.history):
+            del self.history[self.ply :]
+            del self.moves_made[self.ply :]
+            self.checkpoints = {
+                ply: checkpoint
+                for ply, checkpoint in self.checkpoints.items()
+                if ply <= self.ply
+            }
+        if self.ply % self.CHECKPOINT_INTERVAL == 0:
+            self.checkpoints[self.ply] = self.to_bytes(moves=False)
+        self.history.append(
+            row_col_to_chess_notation(*piece.pos) + row_col_to_chess_notation(row, col)
+        )
+        self.ply += 1
+
+    def goto(self, ply):
+        """
+        Jumps to ply of the current line, 0 is the position before the first
+        move. moves_made and history still hold the whole line.
+        """
+        if not 0 <= ply <= len(self.history):
+            raise ValueError(f"Ply {ply} is not in the game, 0-{len(self.history)}")
+        if ply == self.ply:
+            return
+        self.unshare()
+
+        start = ply - ply % self.CHECKPOINT_INTERVAL
+        while start not in self.checkpoints:
+            start -= self.CHECKPOINT_INTERVAL
+        board = Board.from_bytes(self.checkpoints[start])
+        for move in self.history[start:ply]:
+            board.push_uci(move, validate=False, notation=False)
+
+        history, checkpoints, moves_made = self.history, self.checkpoints, self.moves_made
+        history_shared = self.history_shared
+        self.__dict__.update(board.__dict__)
+        self.history, self.checkpoints, self.moves_made = history, checkpoints, moves_made
+        self.history_shared = history_shared
+        self.ply = ply
+
+    def push_uci(self, uci: str, validate=True, notation=True):
+        """
+        Play a move given in coordinate notation, e.g. "e2e4" or "e7e8q".
+        Pawns reaching the last rank are promoted to the given piece, or a queen.
+
+        Arguments:
+            uci<str>: from square, to square and optional promotion piece
+            validate<bool>: raise ValueError if the move is not legal
+            notation<bool>: add the move to moves_made and history
+        """
+        if len(uci) not in [4, 5] or uci[4:].lower() not in ["", "q", "r", "b", "n"]:
+            raise ValueError(f"Not a move in coordinate notation: {uci!r}")
+        from_row, from_col = chess_notation_to_row_col(uci[:2])
+        row, col = chess_notation_to_row_col(uci[2:4])
+        piece = self[from_row][from_col]
+        if not piece or piece.color != self.turn:
+            raise ValueError(f"No piece to move on {uci[:2]} in {uci}")
+        if validate and (row, col) not in piece.get_legal_moves(self):
+            raise ValueError(f"Illegal move {uci}")
+
+        iscopy = self.iscopy
+        self.iscopy = iscopy or not notation  # copies skip the notation bookkeeping
+        try:
+            self.move(piece, row, col)
+            if isinstance(piece, Pawn) and row in [0, 7]:
+                promotion = uci[4:5] or "q"
+                self.promote_pawn(
+                    promotion.upper() if piece.color == "W" else promotion.lower()
+                )
+        finally:
+            self.iscopy = iscopy
+
     def detect_check(self):
         return check(self)
 
-    def capture(self, row, col):
+    def capture(self, row, col, update=True):
         """** Must be called before updating attacking pieces position **"""
+        self.unshare()
         self.chess_board[row][col] = None
+        self.changed_rank(row)
         for piece in self.pieces:
             if piece.pos == (row, col):
                 self.pieces.remove(piece)
+                self.toggle_key(piece)
+        if update:
+            self.update_attacks()
+
+    def update_attacks(self):
+        """
+        Updates the occupancy bitboards, the squares attacked by each side
+        and the pieces giving check. The attacks of every piece are kept in
+        piece.attacks and only recomputed for pieces that moved or are new,
+        and for sliders reaching a square whose occupancy changed since the
+        last update. Sliders look through the enemy king, so a king can not
+        step back along the line it is checked on.
+        """
+        previous = self.__dict__.get("occupancy")
+        self.occupancy = {"W": 0, "B": 0}
+        for piece in self.pieces:
+            self.occupancy[piece.color] |= 1 << (piece.row * 8 + piece.col)
+        changed = ALL_SQUARES
+        if previous:
+            changed = (previous["W"] ^ self.occupancy["W"]) | (
+                previous["B"] ^ self.occupancy["B"]
+            )
+
+        attacked = {"W": 0, "B": 0}
+        for piece in self.pieces:
+            pos, bits = piece.attacks
+            if pos != piece.pos or bits & changed and isinstance(piece, Slider):
+                bits = piece.attack_bits(self)
+                piece.attacks = piece.pos, bits
+            attacked[piece.color] |= bits
+
+        checkers = {"W": [], "B": []}
+        for color, king in self.kings.items():
+            if self[king.row][king.col] is king:
+                bit = 1 << (king.row * 8 + king.col)
+                checkers[color] = [
+                    piece
+                    for piece in self.pieces
+                    if piece.color != color and piece.attacks[1] & bit
+                ]
+        self.attacked = attacked
+        self.checkers = checkers
+        self.masks = {}
+
+    def legality_masks(self, color) -> tuple:
+        """
+        Check evasion and pin masks of color, cached until the next
+        update_attacks()
+
+        Returns:
+            <tuple(int, dict)> bitboard of the squares pieces other than the
+            king may move to: every square, the checking piece and the squares
+            between it and the king, or none in double check. And the pin ray
+            bitboard, up to and with the pinning piece, by pinned piece square
+        """
+        if color in self.masks:
+            return self.masks[color]
+        king = self.kings.get(color)
+        if not king or self[king.row][king.col] is not king:
+            self.masks[color] = ALL_SQUARES, {}
+            return self.masks[color]
+
+        pins = {}
+        rays = []  # rays from the king to checking sliders
+        for dir_row, dir_col in DIRECTIONS:
+            slider = "b" if dir_row and dir_col else "r"
+            ray = 0
+            pinned = None
+            row, col = king.row + dir_row, king.col + dir_col
+            while 0 <= row < 8 and 0 <= col < 8:
+                ray |= 1 << (row * 8 + col)
+                piece = self[row][col]
+                if piece:
+                    if piece.color == color:
+                        if pinned:
+                            break
+                        pinned = piece
+                    else:
+                        if piece.piece_type in ["q", slider]:
+                            if pinned:
+                                pins[pinned.pos] = ray
+                            else:
+                                rays.append(ray)
+                        break
+                row += dir_row
+                col += dir_col
+
+        checkers = self.checkers[color]
+        check_mask = ALL_SQUARES
+        if len(checkers) > 1:
+            check_mask = 0
+        elif checkers:
+            bit = 1 << (checkers[0].row * 8 + checkers[0].col)
+            check_mask = next((ray for ray in rays if ray & bit), bit)
+        self.masks[color] = check_mask, pins
+        return self.masks[color]
+
+    def is_attacked(self, square, color) -> bool:
+        """
+        Returns:
+            <bool> True if a piece of color attacks square (row, col)
+        """
+        return bool(self.attacked[color] >> (square[0] * 8 + square[1]) & 1)
+
+    def in_check(self, color=None) -> bool:
+        """
+        Returns:
+            <bool> True if the king of color, default side to move, is in check
+        """
+        return bool(self.checkers[color or self.turn])
+
+    def attackers(self, square, color=None, removed=()) -> list:
+        """
+        Arguments:
+            square<tuple(int)>: (row, col)
+            color<str>: only pieces of this color, both if None
+            removed<set>: squares to treat as empty, uncovers x-ray attackers
+
+        Returns:
+            list of pieces attacking square
+        """
+        row, col = square
+        found = []
+        for dir_row, dir_col in DIRECTIONS:
+            diagonal = dir_row != 0 and dir_col != 0
+            r, c = row + dir_row, col + dir_col
+            first = True
+            while 0 <= r < 8 and 0 <= c < 8:
+                piece = self[r][c]
+                if piece and (r, c) not in removed:
+                    kind = piece.piece_type
+                    if (
+                        kind == "q"
+                        or kind == ("b" if diagonal else "r")
+                        or (first and kind == "k")
+                        or (
+                            first
+                            and kind == "p"
+                            and diagonal
+                            and dir_row == (-1 if piece.color == "W" else 1)
+                        )
+                    ):
+                        found.append(piece)
+                    break
+                r += dir_row
+                c += dir_col
+                first = False
+
+        for dir_row, dir_col in KNIGHT_MOVES:
+            r, c = row + dir_row, col + dir_col
+            if 0 <= r < 8 and 0 <= c < 8 and (r, c) not in removed:
+                if self[r][c] and self[r][c].piece_type == "n":
+                    found.append(self[r][c])
+
+        if color:
+            return [piece for piece in found if piece.color == color]
+        return found
+
+    def see(self, piece, row, col) -> int:
+        """
+        Static exchange evaluation of moving piece to [row, col]. Both sides
+        keep recapturing on the square with their least valuable attacker, and
+        stop when it does not pay off. Pins are not considered.
+
+        Returns:
+            <int> material won by the side moving, in PIECE_VALUES
+        """
+        target = self[row][col]
+        removed = {piece.pos}
+        gain = [PIECE_VALUES[target.piece_type] if target else 0]
+        if piece.piece_type == "p" and (row, col) == self.en_passant_able:
+            gain[0] = PIECE_VALUES["p"]
+            removed.add((piece.row, col))
+
+        on_square = PIECE_VALUES[piece.piece_type]
+        side = {"W": "B", "B": "W"}[piece.color]
+        while True:
+            attackers = self.attackers((row, col), side, removed)
+            if not attackers:
+                break
+            attacker = min(attackers, key=lambda p: PIECE_VALUES[p.piece_type])
+            other = {"W": "B", "B": "W"}[side]
+            if attacker.piece_type == "k" and self.attackers(
+                (row, col), other, removed | {attacker.pos}
+            ):
+                break  # the king can not capture into a defended square
+            gain.append(on_square - gain[-1])
+            on_square = PIECE_VALUES[attacker.piece_type]
+            removed.add(attacker.pos)
+            side = other
+
+        for i in range(len(gain) - 1, 0, -1):
+            gain[i - 1] = -max(-gain[i - 1], gain[i])
+        return gain[0]
 
 
 if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:2] == ["analyze"]:
+        from analyze import main
+
+        sys.exit(main(sys.argv[2:]))
+
     b = Board()
     b.capture(1, 4)
     b.capture(1, 3)
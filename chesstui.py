@@ -1,13 +1,21 @@
 from textual.app import App, ComposeResult
+from textual.widget import Widget
 from textual.widgets import Footer, Button, Label
-from textual.containers import Grid, Container, Horizontal, Vertical, ScrollableContainer
+from textual.containers import Grid, Container, Horizontal, Vertical
 from textual.screen import ModalScreen
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+from textual.geometry import Size
+from rich.segment import Segment
+from rich.style import Style
 from textual import on
 from textual.reactive import reactive
 import pyperclip 
 from rich.text import Text
+from collections import OrderedDict
 
 from chess import *
+from uci import EngineError, EnginePool
 
 
 class ChessSquareVisual(Button):
@@ -39,6 +47,9 @@ class ChessSquareVisual(Button):
     def highlight_check(self):
         self.styles.background = "red"
 
+    def highlight_hanging(self):
+        self.styles.background = "#c678dd"
+
     def render(self):
         return self.piece_art
 
@@ -95,6 +106,93 @@ class ChoosePiece(Container):
             for piece in self.pieces[self.color][1:-1] if self.promotion else self.pieces[self.color]:
                 yield Button(piece, id=self.piece_to_str[piece], classes="PickerButton")
 
+class MoveList(ScrollView):
+    """
+    Move list with one row per full move. Only the rows in view are rendered,
+    straight from the moves list, so long games cost nothing extra.
+
+    functions:
+        set_moves(moves): show another moves list
+        update_moves(): call after moves were added or removed
+        show_ply(ply): highlight and scroll to the move leading to ply
+    """
+
+    ROW_WIDTH = 18  # " 100. e4xe5# e4xe5#"
+
+    def __init__(self, moves: list, **kwargs):
+        super().__init__(**kwargs)
+        self.moves = moves
+        self.ply = len(moves)
+
+    def set_moves(self, moves: list):
+        self.moves = moves
+        self.update_moves()
+
+    def update_moves(self):
+        self.ply = len(self.moves)
+        self.virtual_size = Size(self.ROW_WIDTH, (len(self.moves) + 1) // 2)
+        self.scroll_end(animate=False)
+        self.refresh()
+
+    def show_ply(self, ply):
+        self.ply = ply
+        row = max(ply - 1, 0) // 2
+        if not self.scroll_offset.y <= row < self.scroll_offset.y + self.size.height:
+            self.scroll_to(y=max(row - self.size.height // 2, 0), animate=False)
+        self.refresh()
+
+    def render_line(self, y: int) -> Strip:
+        scroll_x, scroll_y = self.scroll_offset
+        row = scroll_y + y
+        width = max(self.size.width, self.ROW_WIDTH)
+        if row >= (len(self.moves) + 1) // 2:
+            return Strip.blank(self.size.width)
+
+        segments = [Segment(f" {row + 1}. ")]
+        for i in [2 * row, 2 * row + 1]:
+            move = self.moves[i] if i < len(self.moves) else ""
+            style = Style(reverse=True) if i == self.ply - 1 else Style()
+            segments.append(Segment(f"{move:>6}", style))
+            segments.append(Segment(" "))
+        strip = Strip(segments).extend_cell_length(width)
+        return strip.crop(scroll_x, scroll_x + self.size.width)
+
+
+class EvaluationBar(Widget):
+    """
+    Engine evaluation from white's side, white fills the bar from the bottom
+
+    variables:
+        share<float>: 0 to 1, expected score of white
+        label<str>: score in pawns, or moves to mate
+    """
+
+    share = reactive(0.5)
+    label = reactive("")
+
+    def set_result(self, result: dict, turn: str):
+        """result of EnginePool.analyse(), scores are from the side to move"""
+        sign = 1 if turn == "W" else -1
+        if result["mate"] is not None:
+            mate = result["mate"]
+            white_mates = (mate > 0) == (turn == "W") if mate else turn == "B"
+            self.share = 1.0 if white_mates else 0.0
+            self.label = ("M" if white_mates else "-M") + str(abs(mate))
+        elif result["score"] is not None:
+            score = sign * result["score"]
+            self.share = 1 / (1 + 10 ** (-score / 400))
+            self.label = f"{score / 100:+.1f}"
+
+    def render(self):
+        height = max(self.size.height - 1, 1)
+        white = round(self.share * height)
+        text = Text(f"{self.label:^{self.size.width}}\n")
+        for row in range(height):
+            color = "white" if row >= height - white else "black"
+            text.append(" " * self.size.width + "\n", style=f"on {color}")
+        return text
+
+
 class InfoBox(Container):
     """ Widget to display information such as moves, game result, engine analysis and such """
 
@@ -106,46 +204,31 @@ class InfoBox(Container):
         with Vertical():
             yield Label("", id="gamestate")
             with Horizontal(id="sidebar"):
-                yield ScrollableContainer(id="moves")
-                # yield EvaluationBar(id="evalFish")
+                yield MoveList(self.moves_made, id="moves")
+                yield EvaluationBar(id="evalFish")
+            yield Label("", id="explorer")
             with Container(id="fen_box"):
                 with Horizontal():
                     yield Label(f"fen: ")
                     yield Button("copy", id="copyfen") 
                 yield Label(f"{board.fen()}", id="fen")
-        
-    def add_single_move(self, move: str, number):
-        string = f" {number}. {move:>6}" # Longest sting is 6 chars, e.g. e4xe5#
-        move = Label(string, id="single")
-        container = self.query_one("#moves")
-        container.mount(move)
-        move.scroll_visible()
-
-    def add_both_moves(self, move: list, number):
-        self.query_one("#single").remove()
-        string = f" {number}. {move[0]:>6} {move[1]:>6}" 
-        move = Label(string)
-        container = self.query_one("#moves")
-        container.mount(move)
-        move.scroll_visible()
 
     def update_moves(self, moves: list):
-        if len(moves) % 2 == 0:
-            self.add_both_moves(moves[-2:], len(moves)//2)
+        move_list = self.query_one(MoveList)
+        if move_list.moves is not moves:
+            move_list.set_moves(moves)
         else:
-            self.add_single_move(moves[-1], len(moves)//2+1)
+            move_list.update_moves()
+
+    def show_ply(self, ply):
+        self.query_one(MoveList).show_ply(ply)
 
     def reset(self):
-        labels = self.query("ScrollableContainer > Label")
-        if labels:
-            for label in labels:
-                label.remove()
+        self.moves_made = board.moves_made
+        self.query_one(MoveList).set_moves(board.moves_made)
         self.query_one("#fen").update(f"fen:\n{board.fen()}")
 
 
-
-
-
 class SelectedPiece:
     """
     Piece currently selected
@@ -153,6 +236,7 @@ class SelectedPiece:
     variables:
         self.piece<Piece>
         self.square<ChessSquareVisual>
+        self.moves<list[tuple(int)]>: legal moves of the piece
         self.kill_piece<Bool>
 
     functions:
@@ -163,15 +247,51 @@ class SelectedPiece:
     def __init__(self):
         self.piece: Piece = None
         self.square: ChessSquareVisual = None
+        self.moves: list = []
         self.kill_piece: bool = False
 
-    def set_(self, piece: Piece, square: ChessSquareVisual):
+    def set_(self, piece: Piece, square: ChessSquareVisual, moves: list):
         self.piece = piece
         self.square = square
+        self.moves = moves
 
     def reset(self):
         self.piece = None
         self.square = None
+        self.moves = []
+
+
+class LegalMoveCache:
+    """
+    Least recently used cache of position key -> Board.legal_move_map()
+
+    Not thread safe, only the UI thread uses it. Workers hand their results
+    over with call_from_thread.
+
+    functions:
+        get(key): move map or None
+        put(key, moves)
+    """
+
+    def __init__(self, size=256):
+        self.size = size
+        self.maps = OrderedDict()
+
+    def get(self, key):
+        moves = self.maps.get(key)
+        if moves is not None:
+            self.maps.move_to_end(key)
+        return moves
+
+    def put(self, key, moves):
+        self.maps[key] = moves
+        self.maps.move_to_end(key)
+        if len(self.maps) > self.size:
+            self.maps.popitem(last=False)
+
+
+def position_key(board):
+    return board.zobrist_key(), board.game_end
 
 
 board = Board()
@@ -185,10 +305,97 @@ class ChessApp(App):
     # SUB_TITLE = "Chess in your terminal"
     CSS_PATH = "statics/chess.tcss"
 
+    show_hanging = False
+
+    def __init__(self, database=None, engine=None, engine_depth=18, **kwargs):
+        super().__init__(**kwargs)
+        self.database = database
+        self.legal_moves = LegalMoveCache()
+        self.engine_command = engine
+        self.engine_depth = engine_depth
+        self.engine_pool = None
+        self.analysis = 0  # number of the latest analyse_position() request
+
+    def new_position(self):
+        """Call after the position on the board changed"""
+        self.precompute_legal_moves()
+        self.analyse_position()
+
+    def legal_move_map(self):
+        """Legal moves of the side to move, computed now if not cached yet"""
+        key = position_key(board)
+        moves = self.legal_moves.get(key)
+        if moves is None:
+            moves = board.legal_move_map()
+            self.legal_moves.put(key, moves)
+        return moves
+
+    def precompute_legal_moves(self):
+        """Fills the cache for the current position in a background thread"""
+        key = position_key(board)
+        if self.legal_moves.get(key) is not None:
+            self.update_gamestate()
+            return
+        snapshot = board.to_bytes(moves=False)
+
+        def compute():
+            moves = Board.from_bytes(snapshot).legal_move_map()
+            self.call_from_thread(self.position_ready, key, moves)
+
+        self.run_worker(compute, thread=True, group="legal_moves")
+
+    def position_ready(self, key, moves):
+        self.legal_moves.put(key, moves)
+        if key == position_key(board):
+            self.update_gamestate()
+
+    async def start_engine(self):
+        pool = EnginePool(self.engine_command, size=1)
+        try:
+            await pool.start()
+        except (EngineError, OSError) as error:
+            self.notify(f"Engine did not start: {error}", severity="error")
+            return
+        self.engine_pool = pool
+        self.query_one(EvaluationBar).display = True
+        self.analyse_position()
+
+    def analyse_position(self):
+        """Live engine evaluation of the current position, replaces the running one"""
+        if not self.engine_pool:
+            return
+        fen, turn = board.fen(), board.turn
+        evaluation_bar = self.query_one(EvaluationBar)
+        self.analysis += 1
+        request = self.analysis
+
+        def show(result):
+            # info lines of a replaced request can still arrive, drop them
+            if request == self.analysis:
+                evaluation_bar.set_result(result, turn)
+
+        async def analyse():
+            try:
+                result = await self.engine_pool.analyse(
+                    fen, depth=self.engine_depth, on_info=show
+                )
+            except EngineError as error:
+                if request == self.analysis:
+                    self.notify(f"Engine error: {error}", severity="error")
+                return
+            show(result)
+
+        self.run_worker(analyse(), group="analysis", exclusive=True)
+
     BINDINGS = [
         ("q", "quit", "Quit"),
         ("r", "reset_board", "Reset board"),
         ("k", "kill_piece", "Capture piece"),
+        ("h", "toggle_hanging", "Hanging pieces"),
+        ("left", "history_back", "Back"),
+        ("right", "history_forward", "Forward"),
+        ("home", "history_start", "Start"),
+        ("end", "history_end", "End"),
     ]
 
     def update_board(self):
@@ -198,16 +405,59 @@ class ChessApp(App):
                 square.piece_art = Text(piece.piece_art, style="black") if piece else ""
                 square.standard_style()
 
+        if self.show_hanging:
+            for piece in self.hanging_pieces():
+                self.query_one(f"#r{piece.row}c{piece.col}").highlight_hanging()
+
         king, check, attacking_piece = board.detect_check()
         if check:
             self.query_one(f"#r{king.row}c{king.col}").highlight_check()
 
+        self.update_explorer()
+
+    def on_mount(self):
+        self.update_explorer()
+        self.precompute_legal_moves()
+        self.query_one(EvaluationBar).display = False
+        if self.engine_command:
+            self.run_worker(self.start_engine(), group="engine")
+
+    async def on_unmount(self):
+        if self.engine_pool:
+            await self.engine_pool.close()
+
+    def update_explorer(self):
+        """Moves played from the current position in the game database"""
+        if not self.database:
+            return
+        lines = [f"{'move':6} {'games':>6}  +W =D -B"]
+        for stat in self.database.explore(board)[:10]:
+            lines.append(
+                f"{stat['move']:6} {stat['games']:>6}  "
+                f"+{stat['white']} ={stat['draws']} -{stat['black']}"
+            )
+        self.query_one("#explorer").update("\n".join(lines))
+
+    def hanging_pieces(self):
+        """Pieces of the side to move the opponent wins material by capturing"""
+        enemy = {"W": "B", "B": "W"}[board.turn]
+        hanging = []
+        for piece in board.pieces:
+            if piece.color != board.turn or piece.piece_type == "k":
+                continue
+            for attacker in board.attackers(piece.pos, enemy):
+                if board.see(attacker, *piece.pos) > 0:
+                    hanging.append(piece)
+                    break
+        return hanging
+
     def restart(self):
         global board
         board = Board()
         selected_piece.reset()
         info_box.reset()
         self.update_board()
+        self.new_position()
 
     @on(Button.Pressed, "#restart")
     def button_restart(self):
@@ -227,7 +477,9 @@ class ChessApp(App):
         board.promote_pawn(new_piece)
         board.game_end = False
         self.query_one(ChoosePiece).remove()
+        self.query_one(InfoBox).update_moves(board.moves_made)
         self.update_board()
+        self.new_position()
 
     def action_reset_board(self):
         self.restart()
@@ -235,6 +487,48 @@ class ChessApp(App):
     def action_kill_piece(self):
         selected_piece.kill_piece = True
 
+    def action_toggle_hanging(self):
+        self.show_hanging = not self.show_hanging
+        self.update_board()
+
+    def goto_ply(self, ply):
+        if self.query(ChoosePiece) or not 0 <= ply <= len(board.history):
+            return  # finish the promotion first
+        board.goto(ply)
+        selected_piece.reset()
+        self.query_one(InfoBox).show_ply(ply)
+        self.query_one("#fen").update(f"{board.fen()}")
+        self.update_board()
+        self.new_position()
+
+    def action_history_back(self):
+        self.goto_ply(board.ply - 1)
+
+    def action_history_forward(self):
+        self.goto_ply(board.ply + 1)
+
+    def action_history_start(self):
+        self.goto_ply(0)
+
+    def action_history_end(self):
+        self.goto_ply(len(board.history))
+
+    def update_gamestate(self):
+        self.query_one("#gamestate").update("")
+
+        if not any(self.legal_move_map().values()):
+            board.game_end = True
+            if board.in_check():
+                self.query_one("#gamestate").update("Checkmate")
+            else:
+                self.query_one("#gamestate").update("Remis: Stalemate")
+
+        if board.fifty_moves():
+            self.query_one("#gamestate").update("Remis: 50 move rule")
+
+        if board.repetition():
+            self.query_one("#gamestate").update("Remis: repetition")
+
     def compose(self) -> ComposeResult:
         with Horizontal():
             yield visual_board
@@ -250,17 +544,18 @@ class ChessApp(App):
             board.capture(square_pressed.row, square_pressed.col)
             self.update_board()
             selected_piece.kill_piece = False
+            self.new_position()
             return
 
         # --- Selecting piece to move ---
         if (not selected_piece.piece or (piece.color == board.turn if piece else False)) and not selected_piece.piece is piece:
             if piece and piece.color == board.turn:
                 self.update_board()
-                selected_piece.set_(piece, square_pressed)
+                moves = self.legal_move_map().get(piece.pos, [])
+                selected_piece.set_(piece, square_pressed, moves)
                 square_pressed.highlight()
-                selected_piece.piece.update_legal_moves(board)
 
-                for move in selected_piece.piece.legal_moves:
+                for move in selected_piece.moves:
                     self.query_one("#r%dc%d" % move).highlight_moves()
 
             else:
@@ -272,7 +567,7 @@ class ChessApp(App):
             if selected_piece.piece:
                 if (square_pressed.row,
                     square_pressed.col,
-                ) in selected_piece.piece.legal_moves:
+                ) in selected_piece.moves:
                     board.move(selected_piece.piece, square_pressed.row, square_pressed.col)
 
                     # --- promotion ---
@@ -285,15 +580,4 @@ class ChessApp(App):
             self.query_one("#fen").update(f"{board.fen()}")
             selected_piece.reset()
             self.update_board()
-
-            if board.checkmate():
-                self.query_one("#gamestate").update("Checkmate")
-
-            if board.stalemate():
-                self.query_one("#gamestate").update("Remis: Stalemate")
-
-            if board.fifty_moves():
-                self.query_one("#gamestate").update("Remis: 50 move rule")
-
-            if board.repetition():
-                self.query_one("#gamestate").update("Remis: repetition")
+            self.new_position()
@@ -0,0 +1,200 @@
+"""
+Position index over a game archive
+
+The index is a table of (zobrist key, game id, ply, next move) records sorted
+by key, stored as positions.npy next to results.npy with the result of every
+game. Queries binary search the memory-mapped table, so only a few pages are
+read per lookup.
+
+usage:
+    python database.py build games.txt index/
+    python database.py query index/ "<fen>"
+"""
+
+import argparse
+import heapq
+import os
+import sys
+import tempfile
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from chess import NO_MOVE, Board, decode_move, encode_move, read_games
+
+RECORD = np.dtype([("key", "<u8"), ("game", "<u4"), ("ply", "<u2"), ("move", "<u2")])
+RESULTS = ["1-0", "1/2-1/2", "0-1", "*"]
+
+
+def replay_game(moves, validate=True) -> list:
+    """
+    Returns:
+        list of (zobrist key, ply, next move) of every position of the game,
+        the start position included, next move NO_MOVE for the last one
+
+    Raises:
+        ValueError: if a move can not be played
+    """
+    board = Board()
+    records = []
+    for ply, move in enumerate(moves):
+        records.append((board.zobrist_key(), ply, encode_move(move)))
+        board.push_uci(move, validate=validate, notation=False)
+    records.append((board.zobrist_key(), len(moves), NO_MOVE))
+    return records
+
+
+def build_index(games, directory, run_size=1_000_000, validate=True, log=sys.stderr):
+    """
+    Replays games and writes the sorted position table. Records are sorted in
+    runs of run_size and merged into the final table, so memory stays bounded
+    for any archive size. A game with a move that can not be played is left
+    out and reported on log, game ids stay the line numbers of the games.
+
+    Arguments:
+        games<iterable>: (moves, result) tuples, as yielded by read_games()
+        validate<bool>: check that every move is legal, False only for
+            archives known to be clean
+
+    Returns:
+        <int> number of positions indexed
+    """
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        runs = []
+        results = []
+        buffer = np.empty(run_size, dtype=RECORD)
+        filled = 0
+
+        def flush():
+            nonlocal filled
+            run = np.sort(buffer[:filled], order="key", kind="stable")
+            path = os.path.join(tmp, f"run_{len(runs):05d}.npy")
+            np.save(path, run)
+            runs.append(path)
+            filled = 0
+
+        for game, (moves, result) in enumerate(games):
+            results.append(RESULTS.index(result))
+            try:
+                records = replay_game(moves, validate)
+            except ValueError as error:
+                if log:
+                    print(f"skipped game {game + 1}: {error}", file=log)
+                continue
+            for key, ply, move in records:
+                if filled == run_size:
+                    flush()
+                buffer[filled] = (key, game, ply, move)
+                filled += 1
+        if filled:
+            flush()
+
+        np.save(os.path.join(directory, "results.npy"), np.array(results, dtype=np.uint8))
+        total = sum(np.load(path, mmap_mode="r").shape[0] for path in runs)
+        table = open_memmap(
+            os.path.join(directory, "positions.npy"), mode="w+", dtype=RECORD, shape=(total,)
+        )
+
+        # --- merge the sorted runs ---
+        streams = [iter(np.load(path, mmap_mode="r")) for path in runs]
+        merged = heapq.merge(*streams, key=lambda record: int(record["key"]))
+        block = np.empty(65536, dtype=RECORD)
+        written = 0
+        while True:
+            count = 0
+            for count, record in enumerate(merged, start=1):
+                block[count - 1] = record
+                if count == len(block):
+                    break
+            table[written : written + count] = block[:count]
+            written += count
+            if count < len(block):
+                break
+        table.flush()
+        del table, streams, merged
+    return total
+
+
+class GameDatabase:
+    """
+    Read only view of an index built by build_index()
+
+    functions:
+        lookup(key): records of a zobrist key
+        games(board): (game id, ply) of every game that reached the position
+        explore(board): statistics of the moves played from the position
+    """
+
+    def __init__(self, directory):
+        self.positions = np.load(os.path.join(directory, "positions.npy"), mmap_mode="r")
+        self.results = np.load(os.path.join(directory, "results.npy"), mmap_mode="r")
+        self.keys = self.positions["key"]
+
+    def __len__(self):
+        return len(self.results)
+
+    def lookup(self, key) -> np.ndarray:
+        key = np.uint64(key)
+        start = np.searchsorted(self.keys, key, side="left")
+        end = np.searchsorted(self.keys, key, side="right")
+        return self.positions[start:end]
+
+    def games(self, board) -> list:
+        return [
+            (int(record["game"]), int(record["ply"]))
+            for record in self.lookup(board.zobrist_key())
+        ]
+
+    def explore(self, board) -> list:
+        """
+        Returns:
+            list of dicts with move, games, white, draws, black and unknown,
+            most played move first
+        """
+        records = self.lookup(board.zobrist_key())
+        records = records[records["move"] != NO_MOVE]
+        results = self.results[records["game"]]
+        stats = []
+        for move in np.unique(records["move"]):
+            played = results[records["move"] == move]
+            counts = np.bincount(played, minlength=len(RESULTS))
+            stats.append(
+                {
+                    "move": decode_move(int(move)),
+                    "games": int(len(played)),
+                    "white": int(counts[0]),
+                    "draws": int(counts[1]),
+                    "black": int(counts[2]),
+                    "unknown": int(counts[3]),
+                }
+            )
+        stats.sort(key=lambda stat: -stat["games"])
+        return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build")
+    build.add_argument("games", help="file with one game per line")
+    build.add_argument("directory")
+    build.add_argument("--run-size", type=int, default=1_000_000)
+    build.add_argument("--no-validate", action="store_true", help="skip the legality check")
+    query = commands.add_parser("query")
+    query.add_argument("directory")
+    query.add_argument("fen")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        positions = build_index(
+            read_games(args.games), args.directory, args.run_size, not args.no_validate
+        )
+        print(f"{positions} positions indexed in {args.directory}")
+    else:
+        database = GameDatabase(args.directory)
+        for stat in database.explore(Board.from_fen(args.fen)):
+            print(
+                f"{stat['move']:6} {stat['games']:6} games  "
+                f"+{stat['white']} ={stat['draws']} -{stat['black']}"
+            )
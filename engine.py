@@ -0,0 +1,77 @@
+"""
+Alpha-beta search over Board
+"""
+
+from chess import Board, chess_notation_to_row_col
+from evaluation import Evaluator
+
+MATE = 100_000
+
+
+class Engine:
+    """
+    Fixed depth negamax search with alpha-beta pruning. Captures are searched
+    first, best static exchange first.
+
+    variables:
+        depth<int>: plies searched
+        evaluator<Evaluator>: scores leaf positions, keeps its hash tables
+            between searches
+        nodes<int>: positions searched by the last search()
+    """
+
+    def __init__(self, depth=2, evaluator=None):
+        self.depth = depth
+        self.evaluator = evaluator or Evaluator()
+        self.nodes = 0
+
+    def order(self, board, moves) -> list:
+        def capture_gain(move):
+            from_row, from_col = chess_notation_to_row_col(move[:2])
+            row, col = chess_notation_to_row_col(move[2:4])
+            if not board[row][col]:
+                return -MATE
+            return board.see(board[from_row][from_col], row, col)
+
+        return sorted(moves, key=capture_gain, reverse=True)
+
+    def negamax(self, board, depth, alpha, beta, ply):
+        self.nodes += 1
+        if board.fifty_moves() or board.repetition():
+            return 0
+        if depth <= 0:
+            return self.evaluator.evaluate(board)  # mates show up one ply later
+        moves = board.legal_moves_uci()
+        if not moves:
+            return -(MATE - ply) if board.in_check() else 0
+
+        snapshot = board.to_bytes(moves=False)
+        for move in self.order(board, moves):
+            child = Board.from_bytes(snapshot)
+            child.push_uci(move, validate=False, notation=False)
+            score = -self.negamax(child, depth - 1, -beta, -alpha, ply + 1)
+            if score >= beta:
+                return beta
+            alpha = max(alpha, score)
+        return alpha
+
+    def search(self, board) -> tuple:
+        """
+        Returns:
+            <tuple(int, str)> score in centipawns from the side to move and the
+            best move, None if there are no legal moves
+        """
+        self.nodes = 0
+        moves = board.legal_moves_uci()
+        if not moves:
+            return (-MATE if board.in_check() else 0), None
+
+        snapshot = board.to_bytes(moves=False)
+        alpha, best = -MATE - 1, None
+        for move in self.order(board, moves):
+            child = Board.from_bytes(snapshot)
+            child.push_uci(move, validate=False, notation=False)
+            score = -self.negamax(child, self.depth - 1, -MATE - 1, -alpha, 1)
+            if score > alpha:
+                alpha, best = score, move
+        return alpha, best
@@ -0,0 +1,218 @@
+"""
+Static evaluation of Board positions, with eval and pawn structure hash tables
+
+Scores are in centipawns from the side to move, so they can be used directly
+by negamax searches.
+"""
+
+import numpy as np
+
+from chess import PIECE_VALUES
+
+# --- piece-square tables, from white's side, index row * 8 + col (a1 = 0) ---
+PIECE_SQUARE = {
+    "p": [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ],
+    "n": [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ],
+    "b": [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ],
+    "r": [
+        0, 0, 0, 5, 5, 0, 0, 0,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ],
+    "q": [
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ],
+    "k": [
+        20, 30, 10, 0, 0, 10, 30, 20,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+    ],
+}
+
+DOUBLED_PAWN = -15
+ISOLATED_PAWN = -15
+PASSED_PAWN = [0, 5, 10, 20, 35, 60, 100, 0]  # by rows advanced
+
+
+class HashTable:
+    """
+    Fixed size table of 64 bit key -> int score. Each key has one slot, and a
+    new entry always replaces the old one.
+
+    variables:
+        hits<int>, misses<int>: lookups found and not found
+    """
+
+    def __init__(self, size=1 << 16):
+        if size & (size - 1):
+            raise ValueError(f"Table size must be a power of two, got {size}")
+        self.mask = size - 1
+        self.keys = np.zeros(size, dtype=np.uint64)
+        self.values = np.zeros(size, dtype=np.int32)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, key):
+        index = key & self.mask
+        if self.keys[index] == key:
+            self.hits += 1
+            return int(self.values[index])
+        self.misses += 1
+        return None
+
+    def store(self, key, value):
+        index = key & self.mask
+        self.keys[index] = key
+        self.values[index] = value
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+
+def pawn_structure(board) -> int:
+    """
+    Returns:
+        <int> doubled, isolated and passed pawn terms, white minus black
+    """
+    files = {"W": [[] for _ in range(8)], "B": [[] for _ in range(8)]}
+    for piece in board.pieces:
+        if piece.piece_type == "p":
+            files[piece.color][piece.col].append(piece.row)
+
+    score = 0
+    for color, sign in [("W", 1), ("B", -1)]:
+        enemy = files["B" if color == "W" else "W"]
+        for col, rows in enumerate(files[color]):
+            if not rows:
+                continue
+            score += sign * DOUBLED_PAWN * (len(rows) - 1)
+            neighbours = files[color][col - 1 : col] + files[color][col + 1 : col + 2]
+            if not any(neighbours):
+                score += sign * ISOLATED_PAWN * len(rows)
+            for row in rows:
+                ahead = [
+                    enemy_row
+                    for enemy_col in range(max(col - 1, 0), min(col + 2, 8))
+                    for enemy_row in enemy[enemy_col]
+                    if (enemy_row > row if color == "W" else enemy_row < row)
+                ]
+                if not ahead:
+                    score += sign * PASSED_PAWN[row if color == "W" else 7 - row]
+    return score
+
+
+def material_and_position(board) -> int:
+    """
+    Returns:
+        <int> material and piece-square score, white minus black
+    """
+    score = 0
+    for piece in board.pieces:
+        if piece.color == "W":
+            score += PIECE_VALUES[piece.piece_type]
+            score += PIECE_SQUARE[piece.piece_type][piece.row * 8 + piece.col]
+        else:
+            score -= PIECE_VALUES[piece.piece_type]
+            score -= PIECE_SQUARE[piece.piece_type][(7 - piece.row) * 8 + piece.col]
+    return score
+
+
+class Evaluator:
+    """
+    Evaluates positions through an eval hash keyed by Board.zobrist_key(), and
+    a pawn hash keyed by Board.pawn_key() for the pawn structure terms. Board
+    keeps both keys up to date on every move, so a hit is two lookups.
+
+    functions:
+        evaluate(board): score from the side to move
+        stats(): hit rates of both tables
+    """
+
+    def __init__(self, eval_size=1 << 16, pawn_size=1 << 14):
+        self.eval_cache = HashTable(eval_size)
+        self.pawn_cache = HashTable(pawn_size)
+
+    def pawn_score(self, board) -> int:
+        key = board.pawn_key()
+        score = self.pawn_cache.get(key)
+        if score is None:
+            score = pawn_structure(board)
+            self.pawn_cache.store(key, score)
+        return score
+
+    def evaluate(self, board) -> int:
+        key = board.zobrist_key()
+        score = self.eval_cache.get(key)
+        if score is None:
+            score = material_and_position(board) + self.pawn_score(board)
+            self.eval_cache.store(key, score)
+        return score if board.turn == "W" else -score
+
+    def stats(self) -> dict:
+        return {"eval": self.eval_cache.stats(), "pawn": self.pawn_cache.stats()}
+
+
+def evaluate(board) -> int:
+    """
+    Returns:
+        <int> score from the side to move, without caching
+    """
+    score = material_and_position(board) + pawn_structure(board)
+    return score if board.turn == "W" else -score
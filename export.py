@@ -0,0 +1,272 @@
+"""
+Export positions from games as training tensors in memory-mapped .npy shards
+
+Every position is stored as 12 bitplanes of 8x8 (white PNBRQK, black pnbrqk,
+row 0 is rank 1) and a feature vector:
+    turn, K, Q, k, q, en passant square (row * 8 + col, -1 if none), halfmoves
+
+usage:
+    python export.py games.txt shards/ [--shard-size 65536]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from chess import Board, read_games
+
+PLANES = "PNBRQKpnbrqk"
+FEATURES = ["turn", "K", "Q", "k", "q", "en_passant", "halfmoves"]
+MANIFEST = "manifest.json"
+
+
+def board_to_planes(board, out=None) -> np.ndarray:
+    """
+    Returns:
+        <np.ndarray> uint8 of shape (12, 8, 8), written into out if given
+    """
+    planes = np.zeros((12, 8, 8), dtype=np.uint8) if out is None else out
+    planes[:] = 0
+    for piece in board.pieces:
+        letter = piece.piece_type.upper() if piece.color == "W" else piece.piece_type
+        planes[PLANES.index(letter), piece.row, piece.col] = 1
+    return planes
+
+
+def board_features(board, out=None) -> np.ndarray:
+    """
+    Returns:
+        <np.ndarray> int16 of shape (7,) in the order of FEATURES
+    """
+    features = np.zeros(len(FEATURES), dtype=np.int16) if out is None else out
+    features[0] = board.turn == "W"
+    for i, castle in enumerate("KQkq"):
+        features[1 + i] = castle in board.casteling
+    if board.en_passant_able:
+        row, col = board.en_passant_able
+        features[5] = row * 8 + col
+    else:
+        features[5] = -1
+    features[6] = board.halfmoves
+    return features
+
+
+class ShardWriter:
+    """
+    Writes positions into fixed size shards through open_memmap, so only the
+    shard being filled is mapped at any time.
+
+    Progress is kept in manifest.json next to the shards. A writer opened on an
+    existing directory continues after the last saved position, positions
+    written after the last save() are overwritten.
+
+    functions:
+        write(board): writes one position
+        write_encoded(planes, features): writes positions encoded before
+        save(games_done): flushes the current shard and updates the manifest
+        close(): unmaps the current shard without saving
+    """
+
+    def __init__(self, directory, shard_size=65536):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.manifest = {"shard_size": shard_size, "games_done": 0, "shards": []}
+        if os.path.exists(self.path(MANIFEST)):
+            with open(self.path(MANIFEST)) as f:
+                self.manifest = json.load(f)
+        self.shard_size = self.manifest["shard_size"]
+        self.planes = None
+        self.features = None
+        if self.manifest["shards"] and self.count < self.shard_size:
+            self.open_shard(mode="r+")
+
+    @property
+    def games_done(self):
+        return self.manifest["games_done"]
+
+    @property
+    def count(self):
+        return self.manifest["shards"][-1]["count"] if self.manifest["shards"] else 0
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def open_shard(self, mode):
+        shard = self.manifest["shards"][-1]
+        self.planes = open_memmap(
+            self.path(shard["planes"]),
+            mode=mode,
+            dtype=np.uint8,
+            shape=(self.shard_size, 12, 8, 8),
+        )
+        self.features = open_memmap(
+            self.path(shard["features"]),
+            mode=mode,
+            dtype=np.int16,
+            shape=(self.shard_size, len(FEATURES)),
+        )
+
+    def new_shard(self):
+        number = len(self.manifest["shards"])
+        self.manifest["shards"].append(
+            {
+                "planes": f"planes_{number:05d}.npy",
+                "features": f"features_{number:05d}.npy",
+                "count": 0,
+            }
+        )
+        self.open_shard(mode="w+")
+
+    def next_index(self) -> int:
+        if self.planes is None or self.count == self.shard_size:
+            if self.planes is not None:
+                self.close_shard()
+            self.new_shard()
+        return self.count
+
+    def write(self, board):
+        i = self.next_index()
+        board_to_planes(board, out=self.planes[i])
+        board_features(board, out=self.features[i])
+        self.manifest["shards"][-1]["count"] = i + 1
+
+    def write_encoded(self, planes, features):
+        """
+        Arguments:
+            planes<np.ndarray>: (n, 12, 8, 8) as from board_to_planes
+            features<np.ndarray>: (n, 7) as from board_features
+        """
+        start = 0
+        while start < len(planes):
+            i = self.next_index()
+            end = min(start + self.shard_size - i, len(planes))
+            self.planes[i : i + end - start] = planes[start:end]
+            self.features[i : i + end - start] = features[start:end]
+            self.manifest["shards"][-1]["count"] = i + end - start
+            start = end
+
+    def close_shard(self):
+        self.planes.flush()
+        self.features.flush()
+        self.planes = None
+        self.features = None
+
+    def save(self, games_done):
+        if self.planes is not None:
+            self.planes.flush()
+            self.features.flush()
+        self.manifest["games_done"] = games_done
+        tmp = self.path(MANIFEST + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp, self.path(MANIFEST))  # never leave a half written manifest
+
+    def close(self):
+        """
+        Saving is left to the caller, so a run that fails halfway keeps the
+        manifest of the last game boundary
+        """
+        if self.planes is not None:
+            self.close_shard()
+
+
+def encode_game(moves, validate=True) -> tuple:
+    """
+    Returns:
+        <tuple(np.ndarray, np.ndarray)> planes and features of every position
+        of the game, the start position included
+
+    Raises:
+        ValueError: if a move can not be played
+    """
+    planes = np.zeros((len(moves) + 1, 12, 8, 8), dtype=np.uint8)
+    features = np.zeros((len(moves) + 1, len(FEATURES)), dtype=np.int16)
+    board = Board()
+    board_to_planes(board, out=planes[0])
+    board_features(board, out=features[0])
+    for i, move in enumerate(moves, 1):
+        board.push_uci(move, validate=validate, notation=False)
+        board_to_planes(board, out=planes[i])
+        board_features(board, out=features[i])
+    return planes, features
+
+
+def export_games(
+    games, directory, shard_size=65536, save_every=100, validate=True, log=sys.stderr
+):
+    """
+    Replays games and writes every position reached, including the start
+    position, to the shards in directory. Games already exported by an earlier
+    run are skipped. A game with a move that can not be played is left out
+    and its number is added to "skipped" in the manifest.
+
+    Arguments:
+        games<iterable>: (moves, result) tuples, as yielded by read_games()
+        save_every<int>: games between manifest updates
+
+    Returns:
+        <int> number of games exported or skipped in total
+    """
+    writer = ShardWriter(directory, shard_size)
+    skipped = writer.manifest.setdefault("skipped", [])
+    done = writer.games_done
+    try:
+        for number, (moves, _) in enumerate(games):
+            if number < done:
+                continue
+            try:
+                planes, features = encode_game(moves, validate)
+            except ValueError as error:
+                skipped.append(number)
+                if log:
+                    print(f"skipped game {number + 1}: {error}", file=log)
+            else:
+                writer.write_encoded(planes, features)
+            done = number + 1
+            if done % save_every == 0:
+                writer.save(done)
+        writer.save(done)
+    finally:
+        writer.close()
+    return done
+
+
+def iter_batches(directory, batch_size=1024):
+    """
+    Iterates over exported positions without copying them. Batches never span
+    two shards, so the last batch of each shard may be smaller.
+
+    Yields:
+        <tuple(np.ndarray, np.ndarray)> of planes (n, 12, 8, 8) and features (n, 7)
+    """
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    for shard in manifest["shards"]:
+        planes = np.load(os.path.join(directory, shard["planes"]), mmap_mode="r")
+        features = np.load(os.path.join(directory, shard["features"]), mmap_mode="r")
+        for start in range(0, shard["count"], batch_size):
+            end = min(start + batch_size, shard["count"])
+            yield planes[start:end], features[start:end]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("games", help="file with one game per line")
+    parser.add_argument("directory", help="output directory for the shards")
+    parser.add_argument("--shard-size", type=int, default=65536)
+    parser.add_argument("--no-validate", action="store_true")
+    args = parser.parse_args()
+
+    games = export_games(
+        read_games(args.games),
+        args.directory,
+        shard_size=args.shard_size,
+        validate=not args.no_validate,
+    )
+    with open(os.path.join(args.directory, MANIFEST)) as f:
+        skipped = len(json.load(f).get("skipped", []))
+    print(f"{games - skipped} games exported to {args.directory}, {skipped} skipped")
@@ -1,5 +1,19 @@
+import argparse
+
 from chesstui import ChessApp
 
 if __name__ == "__main__":
-    app = ChessApp()
-    app.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="A chess tui in python")
+    parser.add_argument("--db", help="position index built with database.py")
+    parser.add_argument("--engine", help='UCI engine for the evaluation bar, e.g. "stockfish"')
+    parser.add_argument("--engine-depth", type=int, default=18)
+    args = parser.parse_args()
+
+    database = None
+    if args.db:
+        from database import GameDatabase
+
+        database = GameDatabase(args.db)
+
+    app = ChessApp(database=database, engine=args.engine, engine_depth=args.engine_depth)
+    app.run()
@@ -0,0 +1,376 @@
+"""
+Engine against engine matches
+
+Every opening of the suite is played twice, once with each engine as white,
+and the pairs are spread over a process pool. The engines are deterministic,
+so an opening played again would repeat the same games. A match has at most
+two games per opening, and by default it plays all of them. Finished games are written as
+PGN while the match runs. After every pair the Elo difference is updated and
+a sequential probability ratio test (SPRT) of elo0 against elo1 decides if
+the match can stop early.
+
+An engine is given as comma separated Engine/Evaluator settings, e.g.
+"depth=2" or "depth=3,eval_size=1048576".
+
+usage:
+    python match.py "depth=2" "depth=1" [--openings suite.epd] [--games 1000]
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from chess import Board
+from engine import Engine
+from evaluation import Evaluator
+
+OPENINGS = [
+    "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1",
+    "rnbqkbnr/pppppppp/8/8/3P4/8/PPP1PPPP/RNBQKBNR b KQkq d3 0 1",
+    "rnbqkbnr/pppppppp/8/8/2P5/8/PP1PPPPP/RNBQKBNR b KQkq c3 0 1",
+    "rnbqkbnr/pppppppp/8/8/8/5N2/PPPPPPPP/RNBQKB1R b KQkq - 1 1",
+    "rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR w KQkq c6 0 2",
+    "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq e6 0 2",
+    "rnbqkbnr/pppp1ppp/4p3/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/ppp1pppp/8/3p4/3P4/8/PPP1PPPP/RNBQKBNR w KQkq d6 0 2",
+]
+RESULT_SCORES = {"1-0": 1.0, "1/2-1/2": 0.5, "0-1": 0.0}
+
+
+def make_engine(spec) -> Engine:
+    """
+    Returns:
+        <Engine> from a spec like "depth=2,eval_size=65536"
+    """
+    settings = {}
+    for setting in filter(None, spec.split(",")):
+        name, _, value = setting.partition("=")
+        if name not in ["depth", "eval_size", "pawn_size"] or not value.isdigit():
+            raise ValueError(f"Unknown engine setting {setting!r} in {spec!r}")
+        settings[name] = int(value)
+    evaluator = Evaluator(
+        settings.get("eval_size", 1 << 16), settings.get("pawn_size", 1 << 14)
+    )
+    return Engine(settings.get("depth", 2), evaluator)
+
+
+def play_game(white, black, fen, max_plies=200) -> dict:
+    """
+    Plays one game, ended by the Board rules or drawn after max_plies
+
+    Returns:
+        dict with fen, moves (uci), notation (san), result and termination
+    """
+    board = Board.from_fen(fen)
+    engines = {"W": white, "B": black}
+    moves, notation = [], []
+    result, termination = "1/2-1/2", "max_plies"
+    for _ in range(max_plies):
+        _, move = engines[board.turn].search(board)
+        if move is None:
+            if board.in_check():
+                result = "0-1" if board.turn == "W" else "1-0"
+                termination = "checkmate"
+            else:
+                termination = "stalemate"
+            break
+        notation.append(board.san(move))
+        board.push_uci(move, validate=False, notation=False)
+        moves.append(move)
+        if board.fifty_moves():
+            termination = "fifty_moves"
+            break
+        if board.repetition():
+            termination = "repetition"
+            break
+    return {
+        "fen": fen,
+        "moves": moves,
+        "notation": notation,
+        "result": result,
+        "termination": termination,
+    }
+
+
+def play_pair(spec1, spec2, fen, max_plies=200) -> list:
+    """
+    Returns:
+        list of the two games of an opening, engine 1 is white in the first
+    """
+    engine1, engine2 = make_engine(spec1), make_engine(spec2)
+    return [
+        play_game(engine1, engine2, fen, max_plies),
+        play_game(engine2, engine1, fen, max_plies),
+    ]
+
+
+def to_pgn(game, white, black, round_number, date=None) -> str:
+    """
+    Arguments:
+        date<str>: "YYYY.MM.DD", today if None
+    """
+    board = Board.from_fen(game["fen"])
+    fullmove, turn = board.fullmoves, board.turn
+    movetext = []
+    for index, notation in enumerate(game["notation"]):
+        if turn == "W":
+            movetext.append(f"{fullmove}.")
+        elif index == 0:
+            movetext.append(f"{fullmove}...")
+        movetext.append(notation)
+        if turn == "B":
+            fullmove += 1
+        turn = "B" if turn == "W" else "W"
+    movetext.append(game["result"])
+    return (
+        f'[Event "match"]\n'
+        f'[Site "?"]\n'
+        f'[Date "{date or time.strftime("%Y.%m.%d")}"]\n'
+        f'[Round "{round_number}"]\n'
+        f'[White "{white}"]\n'
+        f'[Black "{black}"]\n'
+        f'[Result "{game["result"]}"]\n'
+        f'[SetUp "1"]\n'
+        f'[FEN "{game["fen"]}"]\n'
+        f'[Termination "{game["termination"]}"]\n\n'
+        f'{" ".join(movetext)}\n\n'
+    )
+
+
+# --- statistics ---
+
+
+def elo(score) -> float:
+    """
+    Returns:
+        <float> Elo difference of a score fraction, clamped away from 0 and 1
+    """
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def expected_score(elo_difference) -> float:
+    return 1 / (1 + 10 ** (-elo_difference / 400))
+
+
+def score_and_variance(wins, draws, losses) -> tuple:
+    """
+    Score fraction and per game variance, with one pseudo-draw added so a
+    clean sweep does not have zero variance
+
+    Returns:
+        <tuple(float, float)>
+    """
+    draws += 1
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = (
+        wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score**2
+    ) / games
+    return score, variance
+
+
+def elo_estimate(wins, draws, losses) -> tuple:
+    """
+    Returns:
+        <tuple(float, float)> Elo difference and its 95% error margin
+    """
+    games = wins + draws + losses
+    if not games:
+        return 0.0, math.inf
+    score, variance = score_and_variance(wins, draws, losses)
+    margin = 1.96 * math.sqrt(variance / games)
+    return elo(score), (elo(score + margin) - elo(score - margin)) / 2
+
+
+def sprt(wins, draws, losses, elo0=0.0, elo1=10.0) -> float:
+    """
+    Generalized SPRT over win/draw/loss counts, with the normal approximation
+
+    Returns:
+        <float> log likelihood ratio of elo1 against elo0
+    """
+    games = wins + draws + losses
+    if not games:
+        return 0.0
+    score, variance = score_and_variance(wins, draws, losses)
+    score0, score1 = expected_score(elo0), expected_score(elo1)
+    return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+def sprt_bounds(alpha=0.05, beta=0.05) -> tuple:
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+class Match:
+    """
+    Runs a match of spec1 against spec2, results are counted for spec1
+
+    variables:
+        wins, draws, losses<int>: results of engine 1
+        llr<float>: SPRT log likelihood ratio after the last pair
+        decision<str>: "H1", "H0" or None while the test is running
+    """
+
+    def __init__(
+        self,
+        spec1,
+        spec2,
+        openings=OPENINGS,
+        games=None,
+        max_plies=200,
+        elo0=0.0,
+        elo1=10.0,
+        alpha=0.05,
+        beta=0.05,
+    ):
+        make_engine(spec1), make_engine(spec2)  # raise on bad specs before starting the pool
+        if not openings:
+            raise ValueError("The opening suite is empty")
+        if games is None:
+            games = 2 * len(openings)
+        if games % 2:
+            raise ValueError(f"games must be even, one game per color of an opening: {games}")
+        if games > 2 * len(openings):
+            raise ValueError(
+                f"{games} games need {games // 2} openings, the suite has {len(openings)}"
+            )
+        self.spec1, self.spec2 = spec1, spec2
+        self.openings = openings
+        self.games = games
+        self.max_plies = max_plies
+        self.elo0, self.elo1 = elo0, elo1
+        self.lower, self.upper = sprt_bounds(alpha, beta)
+        self.wins = self.draws = self.losses = 0
+        self.llr = 0.0
+        self.decision = None
+        self.seconds = 0.0
+
+    @property
+    def played(self) -> int:
+        return self.wins + self.draws + self.losses
+
+    def record(self, pair):
+        for index, game in enumerate(pair):
+            score = RESULT_SCORES[game["result"]]
+            if index == 1:
+                score = 1 - score  # engine 1 had black
+            if score == 1:
+                self.wins += 1
+            elif score == 0:
+                self.losses += 1
+            else:
+                self.draws += 1
+        self.llr = sprt(self.wins, self.draws, self.losses, self.elo0, self.elo1)
+        if self.llr >= self.upper:
+            self.decision = "H1"
+        elif self.llr <= self.lower:
+            self.decision = "H0"
+
+    def run(self, pgn=None, workers=None, log=sys.stderr):
+        """
+        Plays pairs until games are played or the SPRT decides. Games are
+        written to pgn as they finish, so their order follows completion.
+        """
+        pairs = self.games // 2
+        pending = 2 * (workers or os.cpu_count() or 1)
+        start = time.perf_counter()
+        with ProcessPoolExecutor(workers) as pool:
+            submitted = 0
+            running = {}
+            while submitted < pairs or running:
+                while submitted < pairs and len(running) < pending:
+                    fen = self.openings[submitted]
+                    future = pool.submit(play_pair, self.spec1, self.spec2, fen, self.max_plies)
+                    running[future] = submitted
+                    submitted += 1
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pair_number = running.pop(future)
+                    pair = future.result()
+                    self.record(pair)
+                    if pgn:
+                        round_number = 2 * pair_number + 1
+                        pgn.write(to_pgn(pair[0], self.spec1, self.spec2, round_number))
+                        pgn.write(to_pgn(pair[1], self.spec2, self.spec1, round_number + 1))
+                        pgn.flush()
+                    if log:
+                        print(self.summary(time.perf_counter() - start), file=log)
+                if self.decision:
+                    for future in running:
+                        future.cancel()
+                    break
+        self.seconds += time.perf_counter() - start
+        return self.stats()
+
+    def summary(self, seconds) -> str:
+        difference, margin = elo_estimate(self.wins, self.draws, self.losses)
+        return (
+            f"games {self.played} +{self.wins} ={self.draws} -{self.losses}  "
+            f"elo {difference:+.1f} +/- {margin:.1f}  "
+            f"llr {self.llr:.2f} ({self.lower:.2f}, {self.upper:.2f})  "
+            f"{self.played / seconds if seconds else 0:.2f} games/sec"
+        )
+
+    def stats(self) -> dict:
+        difference, margin = elo_estimate(self.wins, self.draws, self.losses)
+        return {
+            "games": self.played,
+            "wins": self.wins,
+            "draws": self.draws,
+            "losses": self.losses,
+            "elo": round(difference, 1),
+            "elo_margin": round(margin, 1),
+            "llr": round(self.llr, 3),
+            "decision": self.decision,
+            "games_per_second": round(self.played / self.seconds, 3) if self.seconds else 0.0,
+        }
+
+
+def read_openings(path) -> list:
+    with open(path) as lines:
+        return [
+            line.strip()
+            for line in lines
+            if line.strip() and not line.startswith("#")
+        ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("engine1", help='e.g. "depth=2"')
+    parser.add_argument("engine2")
+    parser.add_argument("--openings", help="FEN/EPD file, one position per line")
+    parser.add_argument(
+        "--games", type=int, default=None, help="maximum number of games, even, two per opening"
+    )
+    parser.add_argument("--max-plies", type=int, default=200, help="draw after this many plies")
+    parser.add_argument("--pgn", help="file to write the games to")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--elo0", type=float, default=0.0)
+    parser.add_argument("--elo1", type=float, default=10.0)
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    args = parser.parse_args()
+
+    openings = read_openings(args.openings) if args.openings else OPENINGS
+    match = Match(
+        args.engine1,
+        args.engine2,
+        openings,
+        args.games,
+        args.max_plies,
+        args.elo0,
+        args.elo1,
+        args.alpha,
+        args.beta,
+    )
+    pgn = open(args.pgn, "w") if args.pgn else None
+    try:
+        print(match.run(pgn, args.workers))
+    finally:
+        if pgn:
+            pgn.close()
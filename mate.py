@@ -0,0 +1,224 @@
+"""
+Mate solver using depth-first proof-number search (df-pn)
+
+The side to move is the attacker. OR nodes are attacker to move, AND nodes are
+defender to move. A node is proven when the attacker mates within the
+remaining plies, and disproven when that is impossible. The remaining plies
+are part of the table key, so the search graph has no cycles.
+
+usage:
+    python mate.py "<fen>" [--moves 5] [--table 1000000]
+"""
+
+import argparse
+from collections import OrderedDict
+
+from chess import Board
+
+INFINITY = 10**9
+EPSILON = 0.25  # df-pn+ 1+epsilon threshold
+
+
+class MateSolver:
+    """
+    df-pn mate search over Board
+
+    variables:
+        table<OrderedDict>: (zobrist key, plies left) -> (pn, dn), least
+            recently used entries are dropped beyond max_table entries
+        expansions<OrderedDict>: (zobrist key, plies left) -> list of
+            (move, child key), or (pn, dn) of a terminal node, bounded like table
+        nodes<int>: nodes expanded so far
+        max_nodes<int>: stop the search after this many nodes, None for no limit
+
+    functions:
+        solve(board, max_moves): shortest mating line, in coordinate notation
+    """
+
+    def __init__(self, max_table=1_000_000, max_nodes=None):
+        self.table = OrderedDict()
+        self.expansions = OrderedDict()
+        self.max_table = max_table
+        self.max_nodes = max_nodes
+        self.nodes = 0
+
+    def lookup(self, key):
+        entry = self.table.get(key)
+        if entry is None:
+            return 1, 1
+        self.table.move_to_end(key)
+        return entry
+
+    def store(self, key, pn, dn):
+        self.table[key] = (pn, dn)
+        self.table.move_to_end(key)
+        if len(self.table) > self.max_table:
+            self.table.popitem(last=False)
+
+    def children(self, board, key):
+        """
+        The child keys come from Board.zobrist_key_after(), so no child board
+        is built, and they are kept for when the search comes back here
+
+        Returns:
+            list of (move, child key) for every legal move, or the proof
+            numbers (pn, dn) if the node is terminal
+        """
+        children = self.expansions.get(key)
+        if children is not None:
+            self.expansions.move_to_end(key)
+            return children
+
+        plies = key[1]
+        attacker = plies % 2 == 1  # the attacker moves on odd plies left
+        moves = board.legal_moves_uci()
+        if not moves:
+            mated = board.in_check()
+            children = (0, INFINITY) if mated and not attacker else (INFINITY, 0)
+        elif plies == 0 or board.fifty_moves():
+            children = INFINITY, 0
+        else:
+            children = [(move, (board.zobrist_key_after(move), plies - 1)) for move in moves]
+
+        self.expansions[key] = children
+        if len(self.expansions) > self.max_table:
+            self.expansions.popitem(last=False)
+        return children
+
+    def mid(self, board, key, threshold_pn, threshold_dn):
+        """
+        Searches below board until its proof or disproof number reaches the
+        threshold, and stores the result in the table. Only the child searched
+        next is built, as a Board.copy() of board.
+        """
+        plies = key[1]
+        children = self.children(board, key)
+        self.nodes += 1
+        if isinstance(children, tuple):
+            self.store(key, *children)
+            return children
+
+        attacker = plies % 2 == 1
+        while True:
+            numbers = [self.lookup(child_key) for _, child_key in children]
+            if attacker:
+                pn = min(child_pn for child_pn, _ in numbers)
+                dn = min(sum(child_dn for _, child_dn in numbers), INFINITY)
+            else:
+                pn = min(sum(child_pn for child_pn, _ in numbers), INFINITY)
+                dn = min(child_dn for _, child_dn in numbers)
+
+            out_of_nodes = self.max_nodes is not None and self.nodes >= self.max_nodes
+            if pn >= threshold_pn or dn >= threshold_dn or out_of_nodes:
+                self.store(key, pn, dn)
+                return pn, dn
+
+            # OR nodes follow the smallest proof number, AND nodes the smallest disproof number
+            order = sorted(
+                range(len(children)),
+                key=lambda i: numbers[i][0] if attacker else numbers[i][1],
+            )
+            best = order[0]
+            second = (
+                numbers[order[1]][0 if attacker else 1] if len(order) > 1 else INFINITY
+            )
+            # 1+epsilon trick: stay in the child a little past the second best,
+            # so the search does not keep switching between siblings
+            second = min(int(second * (1 + EPSILON)) + 1, INFINITY)
+            best_pn, best_dn = numbers[best]
+            if attacker:
+                child_threshold_pn = min(threshold_pn, second)
+                child_threshold_dn = threshold_dn - dn + best_dn
+            else:
+                child_threshold_pn = threshold_pn - pn + best_pn
+                child_threshold_dn = min(threshold_dn, second)
+
+            move, child_key = children[best]
+            child = board.copy()
+            child.push_uci(move, validate=False, notation=False)
+            self.mid(child, child_key, child_threshold_pn, child_threshold_dn)
+
+    def prove(self, board, plies):
+        """
+        Returns:
+            <bool> True if the side to move mates within plies, None if the
+            node limit was reached first
+        """
+        key = (board.zobrist_key(), plies)
+        pn, dn = self.mid(board, key, INFINITY - 1, INFINITY - 1)
+        if pn == 0:
+            return True
+        if dn == 0:
+            return False
+        return None
+
+    def line(self, board, plies) -> list:
+        """
+        Returns:
+            list of moves of a proven mate, re-proving nodes that were dropped
+            from the table, or None if a node could not be proven again
+            within the node limit
+        """
+        moves = []
+        while True:
+            children = self.children(board, (board.zobrist_key(), plies))
+            if isinstance(children, tuple):
+                return moves
+            for move, child_key in children:
+                child = None
+                pn, _ = self.table.get(child_key, (None, None))
+                if pn is None:
+                    child = board.copy()
+                    child.push_uci(move, validate=False, notation=False)
+                    self.prove(child, plies - 1)
+                    pn, _ = self.lookup(child_key)
+                if pn == 0:
+                    break
+            else:
+                return None
+            moves.append(move)
+            if child is None:
+                child = board.copy()
+                child.push_uci(move, validate=False, notation=False)
+            board, plies = child, plies - 1
+
+    def solve(self, board, max_moves=5):
+        """
+        Searches mate in 1, 2, ... max_moves for the side to move
+
+        Returns:
+            list of moves of the shortest mate, or None if there is none
+            within max_moves or the node limit was reached
+        """
+        for moves in range(1, max_moves + 1):
+            proven = self.prove(board, 2 * moves - 1)
+            if proven:
+                return self.line(board, 2 * moves - 1)
+            if proven is None:
+                return None
+        return None
+
+
+def solve_mate(board, max_moves=5, max_table=1_000_000, max_nodes=None):
+    """
+    Returns:
+        list of moves of the shortest mate for the side to move, or None
+    """
+    return MateSolver(max_table, max_nodes).solve(board, max_moves)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("fen")
+    parser.add_argument("--moves", type=int, default=5, help="longest mate to search")
+    parser.add_argument("--table", type=int, default=1_000_000, help="table entries")
+    parser.add_argument("--nodes", type=int, default=None, help="node limit")
+    args = parser.parse_args()
+
+    solver = MateSolver(args.table, args.nodes)
+    line = solver.solve(Board.from_fen(args.fen), args.moves)
+    if line:
+        print(f"Mate in {(len(line) + 1) // 2}: {' '.join(line)}")
+    else:
+        print(f"No mate in {args.moves} found")
+    print(f"{solver.nodes} nodes")
@@ -0,0 +1,345 @@
+"""
+Monte Carlo tree search over Board
+
+The tree lives in flat arrays indexed by node number, children of a node are
+stored next to each other. Leaves are selected in batches with UCT, using
+virtual loss so a batch spreads over the tree, and the batch of rollouts runs
+in a process pool.
+
+Rollouts pick random moves from a pseudo-legal list and only test the chosen
+move for king safety, which is much cheaper than generating the full legal
+move list every ply. Rollouts skip casteling, and are cut off after
+rollout_plies and scored by the static evaluation.
+
+usage:
+    python mcts.py "<fen>" [--playouts 256] [--workers 4]
+"""
+
+import argparse
+import math
+import random
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboards import SLIDER_ATTACKS, squares
+from chess import Board, decode_move, encode_move, row_col_to_chess_notation
+from evaluation import evaluate
+
+
+def pseudo_legal_moves(board) -> list:
+    """
+    Returns:
+        list of moves of the side to move that follow the piece movement
+        rules, without king safety or casteling
+    """
+    moves = []
+    own = board.occupancy[board.turn]
+    occupancy = board.occupancy["W"] | board.occupancy["B"]
+    for piece in board.pieces:
+        if piece.color != board.turn:
+            continue
+        start = row_col_to_chess_notation(*piece.pos)
+        if piece.piece_type == "p":
+            targets = [
+                (row, col)
+                for row, col in piece.attacked_squares(board)
+                if (board[row][col] and board[row][col].color != piece.color)
+                or (row, col) == board.en_passant_able
+            ]
+            step = piece.moves[0]
+            if not board[piece.row + step][piece.col]:
+                targets.append((piece.row + step, piece.col))
+                if piece.row == (1 if piece.color == "W" else 6):
+                    if not board[piece.row + 2 * step][piece.col]:
+                        targets.append((piece.row + 2 * step, piece.col))
+        elif piece.piece_type in SLIDER_ATTACKS:
+            square = piece.row * 8 + piece.col
+            targets = squares(SLIDER_ATTACKS[piece.piece_type](square, occupancy) & ~own)
+        else:
+            targets = [
+                (row, col)
+                for row, col in piece.attacked_squares(board)
+                if not own >> (row * 8 + col) & 1
+            ]
+        moves += [start + row_col_to_chess_notation(*target) for target in targets]
+    return moves
+
+
+def random_move(board, rng):
+    """
+    Returns:
+        <Board> after a random legal move, None if there is none
+    """
+    moves = pseudo_legal_moves(board)
+    rng.shuffle(moves)
+    snapshot = board.to_bytes(moves=False)
+    for move in moves:
+        child = Board.from_bytes(snapshot)
+        child.push_uci(move, validate=False, notation=False)
+        if not child.in_check(board.turn):
+            return child
+    return None
+
+
+def rollout(snapshot, seed, max_plies) -> float:
+    """
+    Plays random moves from the position
+
+    Returns:
+        <float> result for white, 1 win, 0.5 draw, 0 loss
+    """
+    board = Board.from_bytes(snapshot)
+    rng = random.Random(seed)
+    for _ in range(max_plies):
+        child = random_move(board, rng)
+        if child is None:
+            if board.in_check():
+                return 0.0 if board.turn == "W" else 1.0
+            return 0.5
+        board = child
+        if board.fifty_moves() or board.repetition():
+            return 0.5
+    score = evaluate(board) if board.turn == "W" else -evaluate(board)
+    return 1 / (1 + 10 ** (-score / 400))
+
+
+class MCTS:
+    """
+    UCT search with a node pool in arrays and batched rollouts
+
+    variables:
+        parent, first_child, child_count, visits, value, move<array>: one
+            entry per node, child_count is -1 until the node is expanded and
+            value is the sum of results for the side that moved into the node
+        playouts<int>: rollouts finished by all searches
+
+    functions:
+        search(playouts, seconds): grows the tree, returns the best move
+        advance(move): moves the root, keeping the subtree below move
+        stats(): playouts, playouts/sec, nodes and tree memory
+    """
+
+    def __init__(
+        self,
+        board,
+        workers=None,
+        batch_size=16,
+        exploration=1.4,
+        rollout_plies=40,
+        seed=0,
+    ):
+        self.root_snapshot = board.to_bytes(moves=False)
+        self.pool = ProcessPoolExecutor(workers)
+        self.batch_size = batch_size
+        self.exploration = exploration
+        self.rollout_plies = rollout_plies
+        self.rng = random.Random(seed)
+        self.playouts = 0
+        self.seconds = 0.0
+        self.new_tree()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.pool.shutdown()
+
+    # --- node pool ---
+
+    def new_tree(self):
+        self.parent = array("i")
+        self.first_child = array("i")
+        self.child_count = array("i")
+        self.visits = array("i")
+        self.value = array("d")
+        self.move = array("H")
+        self.add_node(-1, 0)
+
+    def add_node(self, parent, move):
+        self.parent.append(parent)
+        self.first_child.append(-1)
+        self.child_count.append(-1)
+        self.visits.append(0)
+        self.value.append(0.0)
+        self.move.append(move)
+        return len(self.parent) - 1
+
+    def __len__(self):
+        return len(self.parent)
+
+    def tree_bytes(self) -> int:
+        arrays = [self.parent, self.first_child, self.child_count, self.visits, self.value, self.move]
+        return sum(len(a) * a.itemsize for a in arrays)
+
+    def children(self, node):
+        first = self.first_child[node]
+        return range(first, first + max(self.child_count[node], 0))
+
+    # --- search ---
+
+    def expand(self, node, board):
+        moves = board.legal_moves_uci()
+        self.first_child[node] = len(self)
+        self.child_count[node] = len(moves)
+        for move in moves:
+            self.add_node(node, encode_move(move))
+
+    def uct(self, node, child):
+        if self.visits[child] == 0:
+            return math.inf
+        return self.value[child] / self.visits[child] + self.exploration * math.sqrt(
+            math.log(self.visits[node]) / self.visits[child]
+        )
+
+    def select(self):
+        """
+        Walks down by UCT, adding a virtual loss to every node on the way
+
+        Returns:
+            <tuple(list[int], Board)> of the path and the leaf position
+        """
+        node = 0
+        path = [0]
+        board = Board.from_bytes(self.root_snapshot)
+        while True:
+            self.visits[node] += 1  # virtual loss, the result is added in backup
+            if self.child_count[node] == -1:
+                if self.visits[node] == 1 and node != 0:
+                    return path, board
+                self.expand(node, board)
+            if self.child_count[node] == 0:
+                return path, board
+            node = max(self.children(node), key=lambda child: self.uct(node, child))
+            board.push_uci(decode_move(self.move[node]), validate=False, notation=False)
+            path.append(node)
+
+    def backup(self, path, result, root_turn):
+        """result is for white, each node stores it for the side that moved into it"""
+        turn = root_turn
+        for node in path:
+            if node != 0:
+                self.value[node] += result if turn == "B" else 1.0 - result
+            turn = "W" if turn == "B" else "B"
+
+    def search(self, playouts=None, seconds=None):
+        """
+        Runs batches until playouts rollouts or seconds have passed
+
+        Returns:
+            <str> most visited move from the root
+        """
+        root_turn = Board.from_bytes(self.root_snapshot).turn
+        start = time.perf_counter()
+        done = 0
+        while True:
+            if playouts is not None and done >= playouts:
+                break
+            if seconds is not None and time.perf_counter() - start >= seconds:
+                break
+            batch = []
+            for _ in range(self.batch_size):
+                path, board = self.select()
+                if self.child_count[path[-1]] == 0:
+                    # game over, the result is known
+                    if board.in_check():
+                        result = 0.0 if board.turn == "W" else 1.0
+                    else:
+                        result = 0.5
+                    self.backup(path, result, root_turn)
+                    done += 1
+                else:
+                    batch.append((path, board.to_bytes(moves=False)))
+            seeds = [self.rng.getrandbits(32) for _ in batch]
+            results = self.pool.map(
+                rollout,
+                [snapshot for _, snapshot in batch],
+                seeds,
+                [self.rollout_plies] * len(batch),
+            )
+            for (path, _), result in zip(batch, results):
+                self.backup(path, result, root_turn)
+            done += len(batch)
+        self.playouts += done
+        self.seconds += time.perf_counter() - start
+        return self.best_move()
+
+    def best_move(self):
+        if self.child_count[0] <= 0:
+            return None
+        best = max(self.children(0), key=lambda child: (self.visits[child], self.value[child]))
+        return decode_move(self.move[best])
+
+    def principal_variation(self) -> list:
+        line = []
+        node = 0
+        while self.child_count[node] > 0:
+            node = max(self.children(node), key=lambda child: self.visits[child])
+            if self.visits[node] == 0:
+                break
+            line.append(decode_move(self.move[node]))
+        return line
+
+    def advance(self, move):
+        """
+        Plays move at the root. The subtree below it is copied into a new pool
+        and becomes the tree, so its statistics carry over to the next search.
+        """
+        board = Board.from_bytes(self.root_snapshot)
+        board.push_uci(move, validate=False, notation=False)
+        self.root_snapshot = board.to_bytes(moves=False)
+
+        code = encode_move(move)
+        root = next((c for c in self.children(0) if self.move[c] == code), None)
+        first_child, child_count, visits, value, moves = (
+            self.first_child, self.child_count, self.visits, self.value, self.move
+        )
+        self.new_tree()
+        if root is None:
+            return
+        self.visits[0], self.value[0] = visits[root], value[root]
+
+        # --- breadth first copy, keeping children next to each other ---
+        queue = deque([(root, 0)])
+        while queue:
+            old_node, new_node = queue.popleft()
+            if child_count[old_node] == -1:
+                continue
+            self.first_child[new_node] = len(self)
+            self.child_count[new_node] = child_count[old_node]
+            start = first_child[old_node]
+            for old_child in range(start, start + child_count[old_node]):
+                new_child = self.add_node(new_node, moves[old_child])
+                self.visits[new_child] = visits[old_child]
+                self.value[new_child] = value[old_child]
+                queue.append((old_child, new_child))
+
+    def stats(self) -> dict:
+        return {
+            "playouts": self.playouts,
+            "playouts_per_second": round(self.playouts / self.seconds, 1) if self.seconds else 0.0,
+            "nodes": len(self),
+            "tree_bytes": self.tree_bytes(),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("fen", nargs="?", default=None, help="start position if none")
+    parser.add_argument("--playouts", type=int, default=256)
+    parser.add_argument("--seconds", type=float, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--rollout-plies", type=int, default=40)
+    args = parser.parse_args()
+
+    board = Board.from_fen(args.fen) if args.fen else Board()
+    with MCTS(board, args.workers, args.batch_size, rollout_plies=args.rollout_plies) as tree:
+        playouts = None if args.seconds else args.playouts
+        move = tree.search(playouts, args.seconds)
+        print(f"best move {move}, line {' '.join(tree.principal_variation())}")
+        print(tree.stats())
@@ -0,0 +1,110 @@
+"""
+Minimal UCI engine for trying out uci.py without Stockfish
+
+Understands uci, isready, ucinewgame, position, go (depth, movetime,
+infinite), stop and quit. Every depth reports the score and best move of a
+one ply search. --delay slows every depth down, and --crash-after exits after
+that many searches, to exercise timeouts and restarts.
+
+usage:
+    python mock_uci_engine.py [--delay 0.05] [--crash-after 10]
+"""
+
+import argparse
+import queue
+import sys
+import threading
+import time
+
+from chess import Board
+from engine import Engine
+
+
+def read_commands(commands):
+    for line in sys.stdin:
+        commands.put(line.strip())
+    commands.put("quit")
+
+
+def parse_position(tokens) -> Board:
+    """position [startpos | fen <fen>] [moves <uci> ...]"""
+    if "moves" in tokens:
+        index = tokens.index("moves")
+        tokens, moves = tokens[:index], tokens[index + 1 :]
+    else:
+        moves = []
+    board = Board.from_fen(" ".join(tokens[1:])) if tokens[0] == "fen" else Board()
+    for move in moves:
+        board.push_uci(move, validate=False, notation=False)
+    return board
+
+
+def go(board, tokens, commands, delay) -> bool:
+    """
+    Searches until the depth or movetime of the go command, or until stop
+
+    Returns:
+        <bool> False if quit was received during the search
+    """
+    depth = int(tokens[tokens.index("depth") + 1]) if "depth" in tokens else None
+    movetime = int(tokens[tokens.index("movetime") + 1]) if "movetime" in tokens else None
+    if depth is None and movetime is None and "infinite" not in tokens:
+        depth = 1
+    deadline = time.monotonic() + movetime / 1000 if movetime else None
+
+    score, best = Engine(depth=1).search(board)
+    score = f"cp {score}" if best or not board.in_check() else "mate 0"
+    running = True
+    current = 0
+    while depth is None or current < depth:
+        current += 1
+        time.sleep(delay)
+        pv = f" pv {best}" if best else ""
+        print(f"info depth {current} score {score} nodes {current * 1000}{pv}", flush=True)
+        if deadline and time.monotonic() >= deadline:
+            break
+        try:
+            command = commands.get_nowait()
+        except queue.Empty:
+            continue
+        if command in ["stop", "quit"]:
+            running = command == "stop"
+            break
+    print(f"bestmove {best or '(none)'}", flush=True)
+    return running
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds per depth")
+    parser.add_argument("--crash-after", type=int, default=None, help="exit after n searches")
+    args = parser.parse_args(argv)
+
+    commands = queue.Queue()
+    threading.Thread(target=read_commands, args=(commands,), daemon=True).start()
+    board = Board()
+    searches = 0
+    while True:
+        tokens = commands.get().split()
+        if not tokens:
+            continue
+        if tokens[0] == "uci":
+            print("id name mock", "id author chess", "uciok", sep="\n", flush=True)
+        elif tokens[0] == "isready":
+            print("readyok", flush=True)
+        elif tokens[0] == "ucinewgame":
+            board = Board()
+        elif tokens[0] == "position":
+            board = parse_position(tokens[1:])
+        elif tokens[0] == "go":
+            searches += 1
+            if args.crash_after is not None and searches > args.crash_after:
+                return 1
+            if not go(board, tokens, commands, args.delay):
+                return 0
+        elif tokens[0] == "quit":
+            return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
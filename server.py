@@ -0,0 +1,212 @@
+"""
+Asyncio game server hosting many independent boards
+
+Clients talk JSON lines over TCP, one request per line:
+    {"id": 1, "op": "create"}
+    {"id": 2, "op": "move", "game": "<game id>", "move": "e2e4"}
+    {"id": 3, "op": "legal_moves", "game": "<game id>"}
+    {"id": 4, "op": "fen", "game": "<game id>"}
+    {"id": 5, "op": "outcome", "game": "<game id>"}
+
+Every response echoes the request id and has "ok", plus the result or "error".
+
+usage:
+    python server.py serve [--port 8765] [--idle 300]
+    python server.py loadtest [--port 8765] [--clients 50] [--requests 200]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from chess import Board
+
+
+class Game:
+    """
+    One hosted game
+
+    variables:
+        board<Board>: live board, None while the game is evicted
+        snapshot<bytes>: Board.to_bytes() of an evicted game
+        last_used<float>: time.monotonic() of the last request
+    """
+
+    def __init__(self):
+        self.board = Board()
+        self.snapshot = None
+        self.last_used = time.monotonic()
+
+    def evict(self):
+        self.snapshot = self.board.to_bytes(moves=False)
+        self.board = None
+
+    def restore(self):
+        self.board = Board.from_bytes(self.snapshot)
+        self.snapshot = None
+
+
+class GameServer:
+    """
+    Holds all games keyed by game id, and evicts games that have been idle for
+    longer than idle_timeout seconds down to a Board.to_bytes() snapshot.
+    """
+
+    def __init__(self, idle_timeout=300.0):
+        self.games = {}
+        self.idle_timeout = idle_timeout
+        self.evictions = 0
+
+    # --- requests ---
+
+    async def handle_request(self, request):
+        op = request.get("op")
+        if op == "create":
+            game_id = uuid.uuid4().hex[:12]
+            self.games[game_id] = Game()
+            return {"game": game_id}
+
+        game = self.games.get(request.get("game"))
+        if game is None:
+            raise ValueError(f"Unknown game {request.get('game')}")
+
+        # No await from here on, so no other request can touch the game
+        # before this one is answered and no lock is needed
+        game.last_used = time.monotonic()
+        if game.board is None:
+            game.restore()
+
+        if op == "move":
+            move = request["move"]
+            if not isinstance(move, str):
+                raise ValueError(f"Move must be a string, not {move!r}")
+            game.board.push_uci(move, notation=False)
+            return {"fen": game.board.fen()}
+        if op == "legal_moves":
+            return {"moves": game.board.legal_moves_uci()}
+        if op == "fen":
+            return {"fen": game.board.fen()}
+        if op == "outcome":
+            return {"outcome": game.board.outcome()}
+        raise ValueError(f"Unknown op {op}")
+
+    async def handle_client(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                request = {}
+                try:
+                    request = json.loads(line)
+                    response = await self.handle_request(request)
+                    response["ok"] = True
+                except (KeyError, ValueError, TypeError, AttributeError) as error:
+                    response = {"ok": False, "error": str(error)}
+                response["id"] = request.get("id") if isinstance(request, dict) else None
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # --- eviction ---
+
+    def evict_idle(self):
+        now = time.monotonic()
+        for game in self.games.values():
+            if game.board is None:
+                continue
+            if now - game.last_used > self.idle_timeout:
+                game.evict()
+                self.evictions += 1
+
+    async def evict_loop(self):
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 4, 0.1))
+            self.evict_idle()
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        evictor = asyncio.create_task(self.evict_loop())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            evictor.cancel()
+
+
+# --- load test ---
+
+
+async def load_test_client(host, port, requests, latencies, rng):
+    reader, writer = await asyncio.open_connection(host, port)
+    request_id = 0
+
+    async def call(**request):
+        nonlocal request_id
+        request_id += 1
+        request["id"] = request_id
+        start = time.perf_counter()
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        return response
+
+    game = (await call(op="create"))["game"]
+    for _ in range(requests):
+        moves = (await call(op="legal_moves", game=game))["moves"]
+        if not moves:
+            game = (await call(op="create"))["game"]
+            continue
+        await call(op="move", game=game, move=rng.choice(moves))
+        await call(op="fen", game=game)
+
+    writer.close()
+    await writer.wait_closed()
+
+
+async def load_test(host="127.0.0.1", port=8765, clients=50, requests=200, seed=0):
+    """
+    Runs clients concurrent games against a running server, each making
+    requests rounds of legal_moves, move and fen.
+
+    Returns:
+        <dict> with requests, seconds, requests_per_second and latency percentiles
+    """
+    latencies = []
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            load_test_client(host, port, requests, latencies, random.Random(rng.random()))
+            for _ in range(clients)
+        )
+    )
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "seconds": round(seconds, 3),
+        "requests_per_second": round(len(latencies) / seconds, 1),
+        "p50_ms": round(1000 * latencies[len(latencies) // 2], 3),
+        "p99_ms": round(1000 * latencies[int(len(latencies) * 0.99)], 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("command", choices=["serve", "loadtest"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--idle", type=float, default=300.0, help="seconds before eviction")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200, help="rounds per client")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        asyncio.run(GameServer(args.idle).serve(args.host, args.port))
+    else:
+        print(json.dumps(asyncio.run(load_test(args.host, args.port, args.clients, args.requests))))
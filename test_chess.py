@@ -0,0 +1,357 @@
+"""
+Regression tests, run with python -m pytest
+"""
+
+import asyncio
+import json
+import os
+import random
+import sys
+
+import pytest
+
+from chess import Board, chess_notation_to_row_col
+from database import GameDatabase, build_index
+from match import OPENINGS, Match, elo_estimate, sprt, sprt_bounds, to_pgn
+from mate import MateSolver
+from server import GameServer
+from uci import EngineError, EnginePool
+
+
+# --- perft, node counts of the move generator ---
+
+PERFT = [
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", 8902),
+    ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 97862),
+    ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", 9467),
+    ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", 62379),
+]
+
+
+def perft(board, depth) -> int:
+    if depth == 0:
+        return 1
+    nodes = 0
+    for move in board.legal_moves_uci():
+        child = board.copy()
+        child.push_uci(move, validate=False, notation=False)
+        nodes += perft(child, depth - 1)
+    return nodes
+
+
+@pytest.mark.parametrize("fen, nodes", PERFT, ids=["startpos", "kiwipete", "pos4", "pos5"])
+def test_perft(fen, nodes):
+    assert perft(Board.from_fen(fen), 3) == nodes
+
+
+# --- bad input ---
+
+
+@pytest.mark.parametrize("square", ["e9", "a0", "i1", "e", "e10", "", "1e"])
+def test_bad_square(square):
+    with pytest.raises(ValueError):
+        chess_notation_to_row_col(square)
+
+
+@pytest.mark.parametrize("uci", ["e9e5", "a0a5", "a8a0", "i2i4", "e2", "e7e8x", "e2e4e5"])
+def test_bad_move_leaves_board(uci):
+    board = Board.from_fen("r3k3/8/8/8/8/8/8/4K3 b - - 0 1")
+    fen = board.fen()
+    with pytest.raises(ValueError):
+        board.push_uci(uci)
+    assert board.fen() == fen
+
+
+def test_server_answers_bad_move():
+    async def session():
+        server = GameServer()
+        tcp = await asyncio.start_server(server.handle_client, "127.0.0.1", 0)
+        port = tcp.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        responses = []
+        requests = [{"id": 1, "op": "create"}]
+        for request in requests:
+            writer.write(json.dumps(request).encode() + b"\n")
+            await writer.drain()
+            responses.append(json.loads(await reader.readline()))
+            if request["op"] == "create":
+                game = responses[-1]["game"]
+                requests += [
+                    {"id": 2, "op": "move", "game": game, "move": "e9e5"},
+                    {"id": 3, "op": "move", "game": game, "move": "a0a5"},
+                    {"id": 4, "op": "move", "game": game, "move": 42},
+                    {"id": 5, "op": "move", "game": game, "move": "e2e4"},
+                ]
+        writer.close()
+        tcp.close()
+        await tcp.wait_closed()
+        return responses
+
+    responses = asyncio.run(session())
+    assert [response["ok"] for response in responses] == [True, False, False, False, True]
+    assert responses[-1]["fen"].startswith("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b")
+
+
+# --- Board.copy ---
+
+
+def test_copy_write_leaves_original():
+    board = Board()
+    for move in "e2e4 e7e5 g1f3".split():
+        board.push_uci(move)
+    fen, history, moves_made = board.fen(), list(board.history), list(board.moves_made)
+    legal = set(board.legal_moves_uci())
+
+    branch = board.copy()
+    branch.push_uci("b8c6")
+    branch.goto(1)
+
+    assert board.fen() == fen
+    assert board.history == history and board.moves_made == moves_made
+    assert set(board.legal_moves_uci()) == legal
+    board.push_uci("d7d5")
+    assert branch.fen().startswith("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b")
+
+
+def test_dropped_copy_keeps_pieces():
+    board = Board()
+    copy = board.copy()
+    del copy
+    pawn = board[1][4]
+    board.move(pawn, 3, 4)
+    assert board[3][4] is pawn and pawn.pos == (3, 4)
+    assert not board.shared
+
+
+def test_live_copy_keeps_original_pieces():
+    class Variant(Board):
+        pass
+
+    board = Variant()
+    copy = board.copy()
+    assert type(copy) is Variant and copy.history is board.history
+    pawn = board[1][4]
+    board.move(pawn, 3, 4)
+    assert board[3][4] is pawn and pawn.pos == (3, 4)
+    assert copy[1][4] is not pawn and copy[1][4].pos == (1, 4) and copy[3][4] is None
+    assert not board.shared and not copy.shared
+
+    copy.push_uci("d2d4")
+    assert copy.history == ["d2d4"] and board.history == ["e2e4"]
+    copy.copy().reset()
+    assert not copy.shared
+
+
+# --- game history ---
+
+
+def test_goto_matches_replay():
+    rng = random.Random(30)
+    board = Board()
+    fens = [board.fen()]
+    for _ in range(50):
+        moves = board.legal_moves_uci()
+        if not moves:
+            break
+        board.push_uci(rng.choice(moves))
+        fens.append(board.fen())
+
+    for ply in rng.sample(range(len(fens)), 10) + [0, len(fens) - 1]:
+        board.goto(ply)
+        assert board.fen() == fens[ply], ply
+
+    board.goto(20)
+    moves_made = board.moves_made[:20]
+    move = rng.choice(board.legal_moves_uci())
+    board.push_uci(move)
+    assert len(board.history) == len(board.moves_made) == 21
+    assert board.history[-1] == move and board.moves_made[:20] == moves_made
+    replay = Board()
+    for move in board.history:
+        replay.push_uci(move)
+    assert board.fen() == replay.fen()
+
+
+# --- static exchange evaluation ---
+
+SEE = [
+    ("4r1k1/8/8/4p3/8/8/4R3/4R1K1 w - - 0 1", "e2e5", 100),  # x-ray rook behind
+    ("4r1k1/8/8/4p3/8/8/4R3/6K1 w - - 0 1", "e2e5", -400),
+    ("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1", "e5d6", 100),  # en passant
+    ("4k3/2p5/8/3pP3/8/8/8/4K3 w - d6 0 1", "e5d6", 0),
+    ("8/8/4k3/3p4/8/5B2/8/3RK3 w - - 0 1", "d1d5", 100),  # d5 defended against the king
+    ("8/8/4k3/3p4/8/8/8/3RK3 w - - 0 1", "d1d5", -400),
+]
+
+
+@pytest.mark.parametrize("fen, move, value", SEE)
+def test_see(fen, move, value):
+    board = Board.from_fen(fen)
+    row, col = chess_notation_to_row_col(move[:2])
+    assert board.see(board[row][col], *chess_notation_to_row_col(move[2:])) == value
+
+
+# --- snapshots ---
+
+
+def test_snapshot_round_trip():
+    board = Board()
+    for move in "e2e4 g8f6 e4e5 b8c6 g1f3 d7d5".split():  # e5 takes d6 en passant
+        board.push_uci(move)
+    restored = Board.from_bytes(board.to_bytes())
+    assert restored.fen() == board.fen()
+    assert restored.moves_made == board.moves_made and len(restored.moves_made) == 6
+    assert restored.positions == board.positions
+    assert restored.zobrist_key() == board.zobrist_key()
+    assert set(restored.legal_moves_uci()) == set(board.legal_moves_uci())
+    assert "e5d6" in restored.legal_moves_uci()
+    assert Board.from_bytes(board.to_bytes(moves=False)).moves_made == []
+
+
+# --- zobrist keys ---
+
+
+def test_incremental_keys_match_rebuild():
+    board = Board()
+    # capture, en passant, promotion with capture and both castlings
+    moves = "e2e4 d7d5 e4d5 c7c5 d5c6 b7b6 c6c7 c8b7 c7b8q a8b8 g1f3 e7e6 f1e2 f8d6"
+    moves += " e1g1 g8e7 d2d4 e8g8"
+    for move in moves.split():
+        board.push_uci(move)
+        rebuilt = Board.from_fen(board.fen())
+        assert board.zobrist_key() == rebuilt.zobrist_key()
+        assert board.pawn_key() == rebuilt.pawn_key()
+
+
+def test_cached_fen_matches_rebuild():
+    board = Board()
+    moves = "e2e4 d7d5 e4d5 c7c5 d5c6 b7b6 c6c7 c8b7 c7b8q a8b8 g1f3 e7e6 f1e2 f8d6"
+    moves += " e1g1 g8e7 d2d4 e8g8"
+    for move in moves.split():
+        board.fen()  # fill the caches before the move
+        board.push_uci(move)
+        fen = board.fen()
+        board.rank_placements, board.placement, board.fen_memo = [None] * 8, None, None
+        assert fen == board.fen(), move
+
+
+# --- mate solver ---
+
+
+def test_mate_in_two():
+    board = Board.from_fen("r2qkb1r/pp2nppp/3p4/2pNN1B1/2BnP3/3P4/PPP2PPP/R2bK2R w KQkq - 1 0")
+    solver = MateSolver()
+    assert solver.solve(board, 3) == ["d5f6", "g7f6", "c4f7"]
+    assert solver.nodes < 300
+
+
+def test_no_mate_is_bounded():
+    board = Board.from_fen("5rk1/pp4pp/4p3/2R3Q1/3n4/2q4r/P1P2PPP/5RK1 b - - 1 1")
+    solver = MateSolver()
+    assert solver.solve(board, 2) is None
+    assert solver.nodes < 3000
+
+
+def test_zobrist_key_after_matches_move():
+    board = Board.from_fen("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    board.push_uci("a2a4")  # en passant on a3 for the b4 pawn
+    for move in board.legal_moves_uci():
+        child = board.copy()
+        child.push_uci(move, validate=False, notation=False)
+        assert board.zobrist_key_after(move) == child.zobrist_key(), move
+
+
+# --- match statistics ---
+
+
+def test_sprt_decides_sweeps():
+    lower, upper = sprt_bounds()
+    assert sprt(200, 0, 0) > upper
+    assert sprt(0, 0, 200) < lower
+    difference, margin = elo_estimate(16, 0, 0)
+    assert difference > 0 and 0 < margin < float("inf")
+
+
+def test_match_games_fit_openings():
+    assert Match("depth=1", "depth=1").games == 2 * len(OPENINGS)
+    with pytest.raises(ValueError):
+        Match("depth=1", "depth=1", games=2 * len(OPENINGS) + 2)
+    with pytest.raises(ValueError):
+        Match("depth=1", "depth=1", games=3)
+
+
+def test_pgn_seven_tag_roster():
+    game = {"fen": OPENINGS[0], "notation": ["e5"], "result": "*", "termination": "max_plies"}
+    tags = [line.split()[0][1:] for line in to_pgn(game, "a", "b", 1).splitlines()[:7]]
+    assert tags == ["Event", "Site", "Date", "Round", "White", "Black", "Result"]
+
+
+# --- game database ---
+
+
+def test_build_index_skips_bad_games(tmp_path):
+    games = [
+        ("e2e4 e7e5".split(), "1-0"),
+        ("e2e4 e9e5".split(), "0-1"),  # not a square
+        ("e2e5 e7e5".split(), "*"),  # illegal
+        ("d2d4".split(), "1/2-1/2"),
+    ]
+    assert build_index(games, tmp_path, log=None) == 3 + 2
+    moves = {stat["move"]: stat["games"] for stat in GameDatabase(tmp_path).explore(Board())}
+    assert moves == {"e2e4": 1, "d2d4": 1}
+
+
+# --- UCI engine pool, against mock_uci_engine.py ---
+
+START = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+MOCK_ENGINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_uci_engine.py")
+
+
+def mock_engine(*options):
+    return [sys.executable, MOCK_ENGINE, *options]
+
+
+def run_pool(command, requests, timeout=30.0):
+    async def session():
+        async with EnginePool(command, size=1, timeout=timeout) as pool:
+            return await requests(pool), pool.stats()
+
+    return asyncio.run(session())
+
+
+def test_pool_analyse():
+    result, stats = run_pool(mock_engine(), lambda pool: pool.analyse(START, depth=3))
+    assert result["depth"] == 3 and result["bestmove"] and not result["stopped"]
+    assert stats["requests"] == 1 and stats["restarts"] == 0
+
+
+def test_pool_timeout_stops_search():
+    result, stats = run_pool(
+        mock_engine("--delay", "0.2"), lambda pool: pool.analyse(START, depth=50), timeout=0.5
+    )
+    assert result["stopped"] and result["bestmove"] and result["depth"] < 50
+    assert stats["timeouts"] == 1
+
+
+def test_pool_restarts_crashed_engine():
+    async def requests(pool):
+        first = await pool.analyse(START, depth=1)
+        second = await pool.analyse(START, depth=1)  # the engine exits on this one
+        return first, second
+
+    (first, second), stats = run_pool(mock_engine("--crash-after", "1"), requests)
+    assert first["bestmove"] and second["bestmove"]
+    assert stats["restarts"] == 1
+
+
+def test_pool_close_fails_queued_requests():
+    async def session():
+        pool = EnginePool(mock_engine("--delay", "0.1"), size=1)
+        await pool.start()
+        requests = [asyncio.create_task(pool.analyse(START, depth=50)) for _ in range(3)]
+        await asyncio.sleep(0.3)
+        await pool.close()
+        return await asyncio.gather(*requests, return_exceptions=True)
+
+    results = asyncio.run(session())
+    assert all(isinstance(result, EngineError) for result in results)
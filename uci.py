@@ -0,0 +1,344 @@
+"""
+Pool of external UCI engines, e.g. Stockfish
+
+Each engine is a persistent subprocess. Requests wait in a queue and every
+engine takes the next one when it is done, sending "position" and "go" in one
+write. A request that runs past its timeout is stopped and returns the best
+result so far, and an engine that crashes or stops answering is restarted.
+
+usage:
+    python uci.py stockfish [files ...] [--depth 18] [--engines 4]
+    python uci.py "python mock_uci_engine.py" positions.epd
+"""
+
+import argparse
+import asyncio
+import fileinput
+import json
+import shlex
+import sys
+import time
+
+from chess import Board
+
+
+class EngineError(Exception):
+    """The engine process died or did not answer in time"""
+
+
+def parse_info(line) -> dict:
+    """
+    Returns:
+        dict of the depth, nodes, score, mate and pv fields of an info line
+    """
+    tokens = line.split()
+    info = {}
+    i = 1
+    while i < len(tokens):
+        token = tokens[i]
+        if token in ["depth", "seldepth", "nodes", "nps", "time"] and i + 1 < len(tokens):
+            info[token] = int(tokens[i + 1])
+            i += 2
+        elif token == "score" and i + 2 < len(tokens):
+            kind, value = tokens[i + 1], int(tokens[i + 2])
+            info["score" if kind == "cp" else "mate"] = value
+            i += 3
+            if i < len(tokens) and tokens[i] in ["lowerbound", "upperbound"]:
+                i += 1
+        elif token == "pv":
+            info["pv"] = tokens[i + 1 :]
+            break
+        elif token == "string":
+            break
+        else:
+            i += 1
+    return info
+
+
+class UCIEngine:
+    """
+    One engine subprocess
+
+    variables:
+        command<list[str]>: program and arguments
+        name<str>: "id name" reported by the engine
+        process<asyncio.subprocess.Process>: None until started
+    """
+
+    def __init__(self, command, startup_timeout=10.0):
+        self.command = command
+        self.startup_timeout = startup_timeout
+        self.name = None
+        self.process = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        await self.send("uci")
+        deadline = time.monotonic() + self.startup_timeout
+        while (line := await self.readline(deadline)) != "uciok":
+            if line.startswith("id name "):
+                self.name = line[len("id name ") :]
+        await self.ready(deadline)
+
+    async def ready(self, deadline):
+        await self.send("isready")
+        while await self.readline(deadline) != "readyok":
+            pass
+
+    async def send(self, *lines):
+        if not self.alive:
+            raise EngineError(f"{self.command[0]} is not running")
+        try:
+            self.process.stdin.write("".join(line + "\n" for line in lines).encode())
+            await self.process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as error:
+            raise EngineError(f"{self.command[0]} closed its input") from error
+
+    async def readline(self, deadline=None) -> str:
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            line = await asyncio.wait_for(self.process.stdout.readline(), timeout)
+        except asyncio.TimeoutError as error:
+            raise EngineError(f"{self.command[0]} did not answer in time") from error
+        if not line:
+            raise EngineError(f"{self.command[0]} exited with {await self.process.wait()}")
+        return line.decode().strip()
+
+    async def analyse(self, fen, depth=None, movetime=None, timeout=None, on_info=None) -> dict:
+        """
+        Searches fen until depth or movetime (ms) is reached, or infinitely if
+        neither is given. After timeout seconds the search is stopped.
+
+        Arguments:
+            on_info<callable>: called with the result so far after every info
+                line with a score
+
+        Returns:
+            dict with fen, bestmove, score (centipawns from the side to move)
+            or mate, depth, nodes, pv and stopped
+        """
+        go = "go"
+        if depth:
+            go += f" depth {depth}"
+        if movetime:
+            go += f" movetime {movetime}"
+        if not depth and not movetime:
+            go += " infinite"
+        await self.send(f"position fen {fen}", go)
+
+        result = {"fen": fen, "bestmove": None, "score": None, "mate": None, "depth": 0,
+                  "nodes": 0, "pv": [], "stopped": False}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                line = await self.readline(deadline)
+            except EngineError:
+                if result["stopped"] or not self.alive:
+                    raise
+                # --- timeout, stop the search and give it a second to answer ---
+                result["stopped"] = True
+                deadline = time.monotonic() + 1.0
+                await self.send("stop")
+                continue
+            if line.startswith("info ") and " score " in line:
+                info = parse_info(line)
+                if "score" in info:
+                    result["score"], result["mate"] = info["score"], None
+                elif "mate" in info:
+                    result["score"], result["mate"] = None, info["mate"]
+                result["depth"] = info.get("depth", result["depth"])
+                result["nodes"] = info.get("nodes", result["nodes"])
+                result["pv"] = info.get("pv", result["pv"])
+                if on_info:
+                    on_info(dict(result))
+            elif line.startswith("bestmove"):
+                move = line.split()[1] if len(line.split()) > 1 else None
+                result["bestmove"] = None if move in [None, "(none)", "0000"] else move
+                return result
+
+    async def quit(self, timeout=2.0):
+        if not self.alive:
+            return
+        try:
+            await self.send("quit")
+            await asyncio.wait_for(self.process.wait(), timeout)
+        except (EngineError, asyncio.TimeoutError):
+            self.process.kill()
+            await self.process.wait()
+
+
+class EnginePool:
+    """
+    Engines sharing one request queue
+
+    variables:
+        size<int>: number of engine processes
+        timeout<float>: seconds before a request is stopped
+        requests, restarts, timeouts<int>: counters for stats()
+
+    functions:
+        analyse(position): result of one Board or fen
+        analyse_many(positions): results in input order
+    """
+
+    def __init__(self, command, size=2, timeout=30.0, queue_size=0):
+        self.command = shlex.split(command) if isinstance(command, str) else list(command)
+        self.size = size
+        self.timeout = timeout
+        self.queue = asyncio.Queue(queue_size)
+        self.engines = []
+        self.workers = []
+        self.requests = self.restarts = self.timeouts = 0
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def start(self):
+        self.engines = [UCIEngine(self.command) for _ in range(self.size)]
+        await asyncio.gather(*(engine.start() for engine in self.engines))
+        self.workers = [asyncio.create_task(self.work(engine)) for engine in self.engines]
+
+    async def restart(self, engine):
+        self.restarts += 1
+        if engine.alive:
+            engine.process.kill()
+            await engine.process.wait()
+        await engine.start()
+
+    async def work(self, engine):
+        while True:
+            (fen, options), future = await self.queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                future.add_done_callback(lambda future: self.stop_cancelled(engine, future))
+                for attempt in range(2):
+                    try:
+                        result = await engine.analyse(fen, timeout=self.timeout, **options)
+                        break
+                    except EngineError:
+                        crashed = not engine.alive  # a hung engine would hang again
+                        await self.restart(engine)
+                        if attempt == 1 or not crashed:
+                            raise
+                self.timeouts += result["stopped"]
+                if not future.cancelled():
+                    future.set_result(result)
+            except EngineError as error:
+                if not future.done():
+                    future.set_exception(error)
+            except OSError as error:  # the restart could not start the program
+                if not future.done():
+                    future.set_exception(EngineError(f"{self.command[0]}: {error}"))
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.set_exception(EngineError("The pool was closed"))
+                raise
+            finally:
+                self.queue.task_done()
+
+    def stop_cancelled(self, engine, future):
+        """Stops the search of a request nobody waits for anymore"""
+        if future.cancelled() and engine.alive:
+            engine.process.stdin.write(b"stop\n")
+
+    async def analyse(self, position, depth=None, movetime=None, on_info=None) -> dict:
+        """
+        Arguments:
+            position<Board|str>: board or fen to analyse
+
+        Returns:
+            dict as returned by UCIEngine.analyse()
+        """
+        if not self.workers:
+            raise EngineError("The pool is not started")
+        fen = position.fen() if isinstance(position, Board) else position
+        future = asyncio.get_running_loop().create_future()
+        self.requests += 1
+        options = {"depth": depth, "movetime": movetime, "on_info": on_info}
+        await self.queue.put(((fen, options), future))
+        return await future
+
+    async def analyse_many(self, positions, depth=None, movetime=None) -> list:
+        return await asyncio.gather(
+            *(self.analyse(position, depth, movetime) for position in positions),
+            return_exceptions=True,
+        )
+
+    async def close(self):
+        """Stops the engines, requests still waiting fail with EngineError"""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        while not self.queue.empty():
+            _, future = self.queue.get_nowait()
+            if not future.done():
+                future.set_exception(EngineError("The pool was closed"))
+        await asyncio.gather(*(engine.quit() for engine in self.engines))
+        self.workers = []
+
+    def stats(self) -> dict:
+        return {
+            "engines": self.size,
+            "requests": self.requests,
+            "queued": self.queue.qsize(),
+            "restarts": self.restarts,
+            "timeouts": self.timeouts,
+        }
+
+
+async def analyse_lines(lines, command, engines, depth, movetime, timeout, batch_size=256):
+    async with EnginePool(command, engines, timeout) as pool:
+        batch = []
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                batch.append(line)
+            if len(batch) == batch_size:
+                await write_results(pool, batch, depth, movetime)
+                batch = []
+        if batch:
+            await write_results(pool, batch, depth, movetime)
+        print(json.dumps(pool.stats()), file=sys.stderr)
+
+
+async def write_results(pool, fens, depth, movetime):
+    results = await pool.analyse_many(fens, depth, movetime)
+    for fen, result in zip(fens, results):
+        if isinstance(result, Exception):
+            result = {"fen": fen, "error": f"{type(result).__name__}: {result}"}
+        print(json.dumps(result))
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("engine", help='engine command, e.g. "stockfish"')
+    parser.add_argument("files", nargs="*", help="FEN/EPD files, stdin if none")
+    parser.add_argument("--engines", type=int, default=2, help="engine processes")
+    parser.add_argument("--depth", type=int, default=None)
+    parser.add_argument("--movetime", type=int, default=None, help="milliseconds per position")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds per position")
+    args = parser.parse_args()
+    if not args.depth and not args.movetime:
+        args.depth = 12
+
+    with fileinput.input(args.files) as lines:
+        asyncio.run(
+            analyse_lines(
+                lines, args.engine, args.engines, args.depth, args.movetime, args.timeout
+            )
+        )